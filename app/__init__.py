@@ -2,6 +2,7 @@
 
 This package contains:
 - obs_client: thin, thread-safe wrapper around obs-websocket-py
+- obs_client_async: asyncio facade over obs_client
 - utils: image utilities (crop, match template)
 - threads: worker threads for each feature
 - ui: CustomTkinter GUI wiring the pieces together
@@ -1,124 +1,1232 @@
 from __future__ import annotations
 
-import base64
+import asyncio
+import binascii
+import json
 import os
+import queue
+import random
 import shutil
+import socket
 import threading
+import time
+from concurrent.futures import CancelledError, Future, TimeoutError as _FutureTimeout
+from dataclasses import dataclass
 from typing import Optional
-import configparser
+import mmap
+import re
 import sys
 from pathlib import Path
 
-from obswebsocket import obsws, requests  # type: ignore
+from obswebsocket import events, obsws, requests  # type: ignore
+
+__all__ = ["ObsClient", "ObsClientPool", "ObsSnapshot"]
+
+try:
+    from obswebsocket.exceptions import MessageTimeout as _MessageTimeout  # type: ignore
+except Exception:  # pragma: no cover - layout differs between releases
+    _MessageTimeout = TimeoutError  # type: ignore
+
+try:
+    from websocket import WebSocketConnectionClosedException as _WsClosed  # type: ignore
+except Exception:  # pragma: no cover - websocket-client ships with obs-websocket-py
+    _WsClosed = ConnectionError  # type: ignore
+
+try:
+    from obswebsocket.exceptions import ConnectionFailure as _ConnFailure, ObjectError as _ObjectError  # type: ignore
+except Exception:  # pragma: no cover - layout differs between releases
+    _ConnFailure = _ObjectError = ConnectionError  # type: ignore
+
+# Errors meaning the socket is gone (as opposed to OBS rejecting a request)
+_CONN_ERRORS = (_WsClosed, ConnectionError, BrokenPipeError)
+
+# What an OBS request attempt in a fallback ladder can raise: timeouts, a lost
+# socket, or a request class that rejects the arguments. Anything else is a bug.
+_OBS_ERRORS = (
+    _MessageTimeout,
+    _FutureTimeout,
+    CancelledError,
+    _ConnFailure,
+    _ObjectError,
+    *_CONN_ERRORS,
+    OSError,
+    KeyError,
+    AttributeError,
+    TypeError,
+    ValueError,
+)
+
+try:
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover - optional speedup
+    orjson = None  # type: ignore
+
+
+def _json_dumps(obj, **kwargs) -> str:
+    if orjson is None or kwargs:
+        return json.dumps(obj, **kwargs)
+    return orjson.dumps(obj).decode("utf-8")
+
+
+def _json_loads(s, **kwargs):
+    if orjson is None or kwargs:
+        return json.loads(s, **kwargs)
+    return orjson.loads(s)
+
+
+class _FastJson:
+    """Stand-in for the ``json`` module seen by ``obswebsocket.core``.
+
+    Screenshot replies carry megabytes of base64 inside JSON; orjson parses
+    them several times faster. Anything else falls through to stdlib json.
+    """
+
+    dumps = staticmethod(_json_dumps)
+    loads = staticmethod(_json_loads)
+
+    def __getattr__(self, name):
+        return getattr(json, name)
+
+
+def _install_fast_json() -> None:
+    # Swap the module reference obswebsocket.core uses, not the stdlib json itself
+    if orjson is None:
+        return
+    try:
+        import obswebsocket.core as _core  # type: ignore
+
+        if getattr(_core, "json", None) is json:
+            _core.json = _FastJson()
+    except Exception:
+        pass
+
+
+_install_fast_json()
+
+
+# Request classes looked up on obswebsocket.requests; availability differs
+# between the v4 (0.5.x) and v5 (1.x) releases of obs-websocket-py.
+_REQUEST_NAMES = (
+    "GetVersion",
+    "ExecuteBatch",
+    "GetSceneList",
+    "SetCurrentScene",
+    "GetSourcesList",
+    "StartRecording",
+    "StartRecord",
+    "StopRecording",
+    "StopRecord",
+    "TriggerHotkeyByName",
+    "StartStopRecording",
+    "ToggleRecording",
+    "GetRecordStatus",
+    "GetStreamingStatus",
+    "GetRecordingFolder",
+    "GetProfileParameter",
+    "SetSourceSettings",
+    "GetSourceScreenshot",
+    "TakeSourceScreenshot",
+    "SaveSourceScreenshot",
+)
+
+# Capability table: request class per name, None when this release lacks it
+_REQ_CAPS: dict[str, Optional[type]] = {name: getattr(requests, name, None) for name in _REQUEST_NAMES}
+
+# Recording control ladders: (request name, kwargs, remember on success)
+_START_ORDER = (
+    ("StartRecording", None, True),
+    ("StartRecord", None, True),
+    ("TriggerHotkeyByName", {"hotkeyName": "OBSBasic.StartRecording"}, False),
+    ("StartStopRecording", None, False),
+    ("ToggleRecording", None, False),
+)
+_STOP_ORDER = (
+    ("StopRecording", None, True),
+    ("StopRecord", None, True),
+    ("TriggerHotkeyByName", {"hotkeyName": "OBSBasic.StopRecording"}, False),
+    ("StartStopRecording", None, False),
+    ("ToggleRecording", None, False),
+)
+
+# *_recording_diag ladders: (request name, kwargs, reported label, OBS_RECORD_METHOD group)
+_START_DIAG_ORDER = (
+    ("StartRecord", None, "StartRecord", "v5"),
+    ("StartRecording", None, "StartRecording", "v4"),
+    ("TriggerHotkeyByName", {"hotkeyName": "OBSBasic.StartRecording"}, "TriggerHotkeyByName", "hotkey"),
+    ("StartStopRecording", None, "ToggleRecording", "toggle"),
+    ("ToggleRecording", None, "ToggleRecording", "toggle"),
+)
+_STOP_DIAG_ORDER = (
+    ("StopRecord", None, "StopRecord", "v5"),
+    ("StopRecording", None, "StopRecording", "v4"),
+    ("TriggerHotkeyByName", {"hotkeyName": "OBSBasic.StopRecording"}, "TriggerHotkeyByName", "hotkey"),
+    ("StartStopRecording", None, "ToggleRecording", "toggle"),
+    ("ToggleRecording", None, "ToggleRecording", "toggle"),
+)
+_RECORD_METHOD_GROUPS = {
+    "startrecord": "v5",
+    "v5": "v5",
+    "startrecording": "v4",
+    "v4": "v4",
+    "hotkey": "hotkey",
+    "toggle": "toggle",
+}
+
+def _env_int(name: str) -> Optional[int]:
+    try:
+        return int(os.getenv(name, "") or "")
+    except Exception:
+        return None
+
+
+# Screenshot/recording preferences from the environment; read at import and
+# on ObsClient.reload_env() instead of on every capture
+_SS_PREF = ""
+_SS_W = 0
+_SS_H = 0
+_SS_QUALITY: Optional[int] = None
+_REC_PREF = ""
+
+
+def _read_env() -> None:
+    global _SS_PREF, _SS_W, _SS_H, _SS_QUALITY, _REC_PREF
+    _SS_PREF = (os.getenv("OBS_SCREENSHOT_METHOD", "") or "").strip().lower()
+    _SS_W = _env_int("OBS_SCREENSHOT_WIDTH") or 0
+    _SS_H = _env_int("OBS_SCREENSHOT_HEIGHT") or 0
+    # Optional server-side compression quality (-1 = OBS default, 0..100)
+    _SS_QUALITY = _env_int("OBS_SCREENSHOT_QUALITY")
+    _REC_PREF = (os.getenv("OBS_RECORD_METHOD", "") or "").strip().lower()
+
+
+_read_env()
+
+# Seconds a resolved recordings directory is reused before re-probing OBS
+_REC_DIR_TTL = 30.0
+
+
+def _obs_config_root() -> Optional[Path]:
+    try:
+        if sys.platform.startswith("win"):
+            appdata = os.getenv("APPDATA") or ""
+            return Path(appdata).joinpath("obs-studio") if appdata else None
+        if sys.platform == "darwin":
+            return Path.home().joinpath("Library", "Application Support", "obs-studio")
+        return Path.home().joinpath(".config", "obs-studio")
+    except Exception:
+        return None
+
+
+# Local OBS settings directory for this platform (resolved once at import)
+_OBS_CONFIG_ROOT = _obs_config_root()
+
+# OBS events (v4 and v5 names) after which cached scene / source names are stale
+_SCENE_EVENTS = (
+    "ScenesChanged",
+    "SceneCollectionChanged",
+    "SceneListChanged",
+    "SceneCreated",
+    "SceneRemoved",
+    "SceneNameChanged",
+    "CurrentSceneCollectionChanged",
+)
+_SOURCE_EVENTS = (
+    "SourceCreated",
+    "SourceDestroyed",
+    "SourceRenamed",
+    "SceneCollectionChanged",
+    "InputCreated",
+    "InputRemoved",
+    "InputNameChanged",
+    "CurrentSceneCollectionChanged",
+)
+# Recording state events: v5 RecordStateChanged, v4 RecordingStarted/Stopped
+_RECORD_EVENTS = (
+    "RecordStateChanged",
+    "RecordingStarted",
+    "RecordingStopped",
+)
+_RECORD_EVENT_STATES = {
+    "OBS_WEBSOCKET_OUTPUT_STARTED": True,
+    "OBS_WEBSOCKET_OUTPUT_STOPPED": False,
+}
+
+# Requests that change OBS state; these run exclusively, everything else shares
+_WRITE_REQUESTS = frozenset({
+    "SetCurrentScene",
+    "StartRecording",
+    "StartRecord",
+    "StopRecording",
+    "StopRecord",
+    "TriggerHotkeyByName",
+    "StartStopRecording",
+    "ToggleRecording",
+    "SetSourceSettings",
+})
+
+
+# Base64 characters decoded per screenshot write chunk (multiple of 4)
+_B64_CHUNK = 64 * 1024
+
+# Screenshot directories already created in this process
+_made_dirs: set[str] = set()
+
+
+def _b64_span(src):
+    """Return ``(body, start, end)`` of the base64 part of a data URI or raw base64.
+
+    The "data:image/...;base64," prefix is located without lowering or
+    splitting the whole payload; bytes come back as a memoryview so slices
+    do not copy.
+    """
+    is_str = isinstance(src, str)
+    sep, prefix = (",", "data:image/") if is_str else (b",", b"data:image/")
+    start = 0
+    if src[:11].lower() == prefix:
+        i = src.find(sep, 11)
+        if i != -1:
+            start = i + 1
+    return (src if is_str else memoryview(src)), start, len(src)
+
+
+def _b64_padded(chunk):
+    # OBS normally sends padded data; repair only when it did not
+    pad = -len(chunk) & 3
+    if pad:
+        chunk = (chunk if isinstance(chunk, str) else bytes(chunk).decode("ascii")) + "=" * pad
+    return chunk
+
+
+def _b64_decoded_size(body, start: int, end: int) -> int:
+    """Byte length ``body[start:end]`` decodes to (padding optional)."""
+    n = end - start
+    size = n // 4 * 3 + {2: 1, 3: 2}.get(n % 4, 0)
+    if n and n % 4 == 0:
+        tail = body[end - 2:end]
+        size -= (tail if isinstance(tail, str) else bytes(tail).decode("ascii", "replace")).count("=")
+    return size
+
+
+def _ensure_dir(d: str) -> None:
+    d = d or "."
+    if d not in _made_dirs:
+        os.makedirs(d, exist_ok=True)
+        _made_dirs.add(d)
+
+
+def _publish_file(src: str, dst: str) -> None:
+    """Move a finished file into place: a rename, or a kernel-side copy across devices."""
+    try:
+        os.replace(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+        os.remove(src)
+
+
+# Abandoned message ids remembered per socket (replies that never come would
+# otherwise grow the set forever)
+_ABANDONED_MAX = 256
+
+# Seconds ObsClientPool waits for an idle session before using the control one
+_POOL_WAIT_SEC = 5.0
+
+# obsws classes whose v5 RequestBatch went unanswered (the library drops op 9
+# frames). Kept per class, not per client, so short-lived clients (UI refresh)
+# do not each sit out the batch timeout again.
+_V5_BATCH_UNROUTED: set = set()
+
+# Per-thread reusable instances of parameterless requests (see _pooled)
+_req_pool = threading.local()
+
+
+def _pooled(cls):
+    """Return this thread's instance of a parameterless request class.
+
+    Pollers issue the same status/list requests several times per second;
+    the instance only carries the last reply, which ``input()`` overwrites.
+    """
+    pool = _req_pool.__dict__
+    req = pool.get(cls)
+    if req is None:
+        req = pool[cls] = cls()
+    return req
+
+
+def _is_local_host(host: str) -> bool:
+    h = (host or "").strip().lower()
+    if h in ("localhost", "127.0.0.1", "::1", ""):
+        return True
+    try:
+        return h == socket.gethostname().lower()
+    except Exception:
+        return False
+
+
+# key = value lines of an ini file; section headers and comments never match
+_INI_LINE_RE = re.compile(rb"^[ \t]*([^=\r\n\[;#][^=\r\n]*?)[ \t]*=[ \t]*([^\r\n]*?)[ \t]*\r?$", re.M)
+
+
+# basic.ini keys naming a recording path, e.g. RecFilePath, FilePath, RecDir
+_REC_KEY_RE = re.compile(r"(?:rec|file).*(?:path|dir)|(?:path|dir).*(?:rec|file)")
+
+
+def _ini_items(path: Path) -> list[tuple[str, str]]:
+    """Return ``(lowercased key, value)`` pairs of an ini file in file order.
+
+    One regex pass over an mmap of the file; no ConfigParser is built since
+    callers only look for a handful of keys regardless of section.
+    """
+    with open(path, "rb") as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return []
+        with mm:
+            return [
+                (m.group(1).decode("utf-8", "replace").lower(), m.group(2).decode("utf-8", "replace"))
+                for m in _INI_LINE_RE.finditer(mm)
+            ]
+
+
+def _mtime_ns(path: Path) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+class _RWLock:
+    """Shared/exclusive lock; a waiting writer holds off new readers.
+
+    Not owner-tracked, so a hold may be released from another thread (the
+    receive thread releases it when the reply arrives).
+    """
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    def acquire_read(self, timeout: Optional[float] = None) -> bool:
+        """Take a shared hold; False if it was not granted within `timeout`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                if not self._wait(deadline):
+                    return False
+            self._readers += 1
+            return True
+
+    def release_read(self) -> None:
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self, timeout: Optional[float] = None) -> bool:
+        """Take the exclusive hold; False if it was not granted within `timeout`."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writer or self._readers:
+                    if not self._wait(deadline):
+                        return False
+            finally:
+                self._writers_waiting -= 1
+                if not self._writers_waiting:
+                    # Readers held off by this writer may go (again) if it gave up
+                    self._cond.notify_all()
+            self._writer = True
+            return True
+
+    def _wait(self, deadline: Optional[float]) -> bool:
+        if deadline is None:
+            self._cond.wait()
+            return True
+        remaining = deadline - time.monotonic()
+        return remaining > 0 and (self._cond.wait(remaining) or time.monotonic() < deadline)
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+
+class _LatestFrames:
+    """Most recent decoded screenshot per (source, imread flags).
+
+    Callers asking for the same source within `max_age` share one capture and
+    decode; a caller arriving while a capture is running waits for it instead
+    of starting its own. Frames are shared, so treat them as read-only.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._key_locks: dict[tuple, threading.Lock] = {}
+        self._slots: dict[tuple, tuple[float, object]] = {}
+
+    def get(self, grab, source_name: str, max_age: float, flags: Optional[int]):
+        # Imported here so the client itself does not need OpenCV
+        import cv2
+
+        from app.utils.image import decode_image
+
+        # None and IMREAD_COLOR decode the same frame: share one slot
+        if flags is None:
+            flags = cv2.IMREAD_COLOR
+        key = (source_name, flags)
+        # Age is measured from arrival, so a caller that waited for a running
+        # capture takes its result instead of starting another one
+        arrived = time.monotonic()
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            hit = self._slots.get(key)
+            if hit is not None and arrived - hit[0] <= max_age:
+                return hit[1]
+            img = decode_image(grab(source_name), flags)
+            if img is not None:
+                # Stamped when ready, so the frame's age is not eaten by the capture itself
+                self._slots[key] = (time.monotonic(), img)
+            return img
+
+
+class _AnswerMap(dict):
+    """Drop-in for ``obsws.answers`` that resolves per-message futures.
+
+    obs-websocket-py's receive thread stores every reply with
+    ``answers[message_id] = data``. When a caller registered a pending request
+    for that id, the reply is fed to it and its future completes instead of
+    the reply being parked in the dict. Parked replies wake ``wait_pop``
+    callers at once instead of the library's sleep-and-poll wait.
+    """
+
+    def __init__(self, initial: Optional[dict] = None) -> None:
+        super().__init__(initial or {})
+        self.waiters: dict[str, tuple[object, Future]] = {}
+        # Ids whose caller gave up; their late replies are dropped, not parked
+        # (insertion-ordered so the oldest can be trimmed when replies never come)
+        self._abandoned: dict[str, None] = {}
+        self._cond = threading.Condition()
+
+    def __setitem__(self, key, value) -> None:
+        pending = self.waiters.pop(str(key), None)
+        if pending is None:
+            with self._cond:
+                if str(key) in self._abandoned:
+                    del self._abandoned[str(key)]
+                    return
+                super().__setitem__(key, value)
+                self._cond.notify_all()
+            return
+        req, fut = pending
+        # False when the caller already gave up (timeout) and cancelled it
+        if not fut.set_running_or_notify_cancel():
+            return
+        try:
+            req.input(value)  # type: ignore[attr-defined]
+        except Exception as e:
+            fut.set_exception(e)
+        else:
+            fut.set_result(req)
+
+    def abandon(self, key: str) -> None:
+        """Stop waiting for ``key``; a reply that still arrives is discarded."""
+        with self._cond:
+            if self.waiters.pop(key, None) is None:
+                return
+            self._abandoned[key] = None
+            if len(self._abandoned) > _ABANDONED_MAX:
+                del self._abandoned[next(iter(self._abandoned))]
+
+    def fail_all(self, exc: BaseException) -> None:
+        """Fail every pending future, e.g. when their socket was replaced."""
+        pending, self.waiters = self.waiters, {}
+        for _req, fut in pending.values():
+            if fut.set_running_or_notify_cancel():
+                fut.set_exception(exc)
+
+    def wait_pop(self, key, timeout: float = 60.0):
+        """Block until a reply for ``key`` is parked, then remove and return it."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while key not in self:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise _MessageTimeout(f"No answer for message {key}")
+                self._cond.wait(remaining)
+            return self.pop(key)
+
+
+class _RawReply:
+    """Request stand-in for frames built by hand; keeps the reply as-is."""
+
+    def __init__(self) -> None:
+        self.datain: Optional[dict] = None
+
+    def input(self, data) -> None:
+        self.datain = data
+
+
+@dataclass
+class ObsSnapshot:
+    """Scene/source names and recording state fetched together."""
+
+    scenes: list[str]
+    sources: list[str]
+    recording: Optional[bool]
+
+
+def _scene_names(items) -> list[str]:
+    out: list[str] = []
+    for s in items or []:
+        try:
+            name = s.get("name") or s.get("sceneName")  # type: ignore[index]
+            if isinstance(name, str):
+                out.append(name)
+        except Exception:
+            continue
+    return out
+
+
+def _source_names(items) -> list[str]:
+    out: list[str] = []
+    for s in items or []:
+        try:
+            name = s.get("name")  # type: ignore[index]
+            if isinstance(name, str):
+                out.append(name)
+        except Exception:
+            continue
+    return out
+
+
+def _names_extractor(items, keys):
+    """Return a plain comprehension for items that all carry one str name key.
+
+    Used to skip the per-item guards of ``_scene_names``/``_source_names``
+    once a reply of the same shape has been seen.
+    """
+    if not isinstance(items, list) or not items:
+        return None
+    for k in keys:
+        if all(isinstance(s, dict) and isinstance(s.get(k), str) for s in items):
+            return lambda lst, k=k: [s[k] for s in lst]
+    return None
+
+
+_RECORDING_KEYS = ("outputActive", "recording", "isRecording")
+
+
+def _recording_key(d) -> Optional[str]:
+    """Name of the bool recording-state field in a status reply, if any."""
+    for k in _RECORDING_KEYS:
+        if isinstance(d.get(k), bool):
+            return k
+    return None
+
+
+def _recording_flag(d) -> Optional[bool]:
+    k = _recording_key(d)
+    return d[k] if k is not None else None
 
 
 class ObsClient:
     """Thread-safe wrapper for obs-websocket-py calls used in this app.
 
-    - Serializes access with a provided lock to avoid concurrent calls.
+    - The lock only guards message-id assignment and the websocket send; each
+      caller then waits for its own reply, so concurrent requests overlap.
+      It is reentrant, so a send path that re-enters the client cannot
+      deadlock on it.
+    - OBS event handlers run on the library's receive thread and must not
+      wait on ObsClient requests: that thread is the one delivering replies.
     - Provides helpers for screenshots, recording control, and text updates.
     """
 
-    def __init__(self, host: str, port: int, password: str, lock: Optional[threading.Lock] = None) -> None:
+    def __init__(self, host: str, port: int, password: str, lock: Optional[threading.RLock] = None) -> None:
         self._ws = obsws(host, port, password)
-        self._lock = lock or threading.Lock()
+        # OBS on this machine can write screenshot files straight to our paths
+        self._is_local = _is_local_host(host)
+        # Send mutex: message-id assignment and socket writes
+        self._lock = lock or threading.RLock()
+        # Persistent session: reconnect lazily after drops until disconnect()
+        self._want_connected = False
+        self._conn_gen = 0
+        self._reconnect_lock = threading.RLock()
+        self._reconnecting = False
+        self._keepalive_stop: Optional[threading.Event] = None
+        # Held from send until reply: queries share it, state changes are exclusive
+        self._rw = _RWLock()
+        # Filled by _detect_version() at connect and by successful record calls
+        self._proto: Optional[int] = None
+        self._start_rec_cls: Optional[type] = None
+        self._stop_rec_cls: Optional[type] = None
+        # (status request class, datain key) that answered is_recording last time
+        self._rec_probe: Optional[tuple[type, str]] = None
+        # Last recording state reported by OBS events (None = unknown); waiters
+        # in wait_recording_state() are woken on every change
+        self._rec_state: Optional[bool] = None
+        self._rec_cond = threading.Condition()
+        self._rec_evt = False
+        # Scene/source names, kept until OBS reports a change (only once the
+        # matching events are registered); _meta_gen bumps on every change
+        self._scenes_cache: Optional[list[str]] = None
+        self._sources_cache: Optional[list[str]] = None
+        self._scenes_evt = False
+        self._sources_evt = False
+        self._meta_gen = 0
+        # Screenshot save request (see take_screenshot) that last wrote our file
+        self._shot_save: Optional[tuple[type, str, str, str]] = None
+        # Shape-specific name extractors learned from the first list replies
+        self._scenes_extract = None
+        self._sources_extract = None
+        # get_recordings_dir cache: (monotonic ts, result) + mtimes of ini files read
+        self._rec_dir_cache: Optional[tuple[float, Optional[str]]] = None
+        self._rec_dir_mtime: dict[Path, int] = {}
+        # Decoded frames shared between detector threads (see get_latest_frame)
+        self._frames = _LatestFrames()
+
+    @classmethod
+    def reload_env(cls) -> None:
+        """Re-read OBS_SCREENSHOT_* / OBS_RECORD_METHOD after the environment changed."""
+        _read_env()
+
+    def connect(self, max_attempts: int = 6, base: float = 0.25, cap: float = 8.0) -> None:
+        """Connect to OBS, retrying with capped exponential backoff plus jitter.
+
+        Covers the window where OBS is still starting up; the last error is
+        re-raised once ``max_attempts`` connects have failed. Once connected the
+        session is kept: dropped sockets are reconnected on the next request
+        and a keepalive request runs every ``OBS_KEEPALIVE_SEC`` (default 30).
+        """
+        self._want_connected = True
+        for attempt in range(max(1, int(max_attempts))):
+            try:
+                self._connect_once()
+                break
+            except Exception:
+                if attempt + 1 >= max_attempts:
+                    raise
+                time.sleep(min(cap, base * 2 ** attempt) * (1 - random.random() * 0.3))
+        self._invalidate_names()
+        self._register_name_events()
+        self._register_record_events()
+        self._shot_save = None
+        try:
+            self._detect_version()
+        except Exception:
+            pass
+        # Resolve which status request/field reports recording for this OBS
+        self._rec_probe = None
+        self._set_rec_state(self._probe_recording())
+        self._start_keepalive()
 
-    def connect(self) -> None:
+    def _connect_once(self) -> None:
         with self._lock:
             self._ws.connect()
+            self._conn_gen += 1
+            answers = getattr(self._ws, "answers", None)
+            if isinstance(answers, dict) and not isinstance(answers, _AnswerMap):
+                answers = self._ws.answers = _AnswerMap(answers)
+            if isinstance(answers, _AnswerMap) and hasattr(self._ws, "_wait_message"):
+                # obsws.call (fallback path) waits on the condition instead of polling
+                timeout = float(getattr(self._ws, "timeout", 60) or 60)
+                self._ws._wait_message = lambda message_id, *_a, **_k: answers.wait_pop(message_id, timeout)
+
+    def _detect_version(self) -> None:
+        """Ask OBS for its websocket protocol once and preselect record requests."""
+        self._proto = None
+        self._start_rec_cls = None
+        self._stop_rec_cls = None
+        req = _REQ_CAPS["GetVersion"]
+        if req is None:
+            return
+        d = getattr(self._send_and_wait(_pooled(req)), "datain", None) or {}
+        if "rpcVersion" in d or "obsWebSocketVersion" in d:
+            self._proto = 5
+        else:
+            v = str(d.get("obs-websocket-version") or "")
+            if v[:1].isdigit():
+                self._proto = int(v.split(".", 1)[0])
+        start, stop = {5: ("StartRecord", "StopRecord"), 4: ("StartRecording", "StopRecording")}.get(
+            self._proto or 0, (None, None)
+        )
+        if start and stop:
+            self._start_rec_cls = _REQ_CAPS[start]
+            self._stop_rec_cls = _REQ_CAPS[stop]
+
+    def _register_name_events(self) -> None:
+        """Subscribe once to the OBS events that change scene/source names."""
+        register = getattr(self._ws, "register", None)
+        if register is None:
+            return
+        for names, handler, flag in (
+            (_SCENE_EVENTS, self._on_scenes_changed, "_scenes_evt"),
+            (_SOURCE_EVENTS, self._on_sources_changed, "_sources_evt"),
+        ):
+            if getattr(self, flag):
+                continue
+            for name in names:
+                ev = getattr(events, name, None)
+                if ev is None:
+                    continue
+                try:
+                    register(handler, ev)
+                    setattr(self, flag, True)
+                except Exception:
+                    pass
+
+    def _register_record_events(self) -> None:
+        """Subscribe once to the OBS events that report recording start/stop."""
+        if self._rec_evt:
+            return
+        register = getattr(self._ws, "register", None)
+        if register is None:
+            return
+        for name in _RECORD_EVENTS:
+            ev = getattr(events, name, None)
+            if ev is None:
+                continue
+            try:
+                register(self._on_record_state, ev)
+                self._rec_evt = True
+            except Exception:
+                pass
+
+    def _on_record_state(self, message=None) -> None:
+        d = getattr(message, "datain", None) or {}
+        name = str(getattr(message, "name", "") or type(message).__name__)
+        if "outputState" in d:
+            # Intermediate STARTING/STOPPING states are ignored
+            state = _RECORD_EVENT_STATES.get(str(d.get("outputState")))
+        elif name == "RecordingStarted":
+            state = True
+        elif name == "RecordingStopped":
+            state = False
+        elif isinstance(d.get("outputActive"), bool):
+            state = d["outputActive"]
+        else:
+            state = None
+        if state is not None:
+            self._set_rec_state(state)
+
+    def _set_rec_state(self, state: Optional[bool]) -> None:
+        with self._rec_cond:
+            self._rec_state = state
+            self._rec_cond.notify_all()
+
+    def wait_recording_state(self, want: bool, timeout: float) -> Optional[bool]:
+        """Block until OBS reports recording == `want`, up to `timeout` seconds.
+
+        Returns True once reached, False on timeout, or None when this session
+        has no recording events (callers then poll `is_recording()`).
+        """
+        if not self._rec_evt:
+            return None
+        with self._rec_cond:
+            return self._rec_cond.wait_for(lambda: self._rec_state is want, timeout)
+
+    def _on_scenes_changed(self, _message=None) -> None:
+        self._meta_gen += 1
+        self._scenes_cache = None
+
+    def _on_sources_changed(self, _message=None) -> None:
+        self._meta_gen += 1
+        self._sources_cache = None
+
+    def _invalidate_names(self) -> None:
+        self._meta_gen += 1
+        self._scenes_cache = None
+        self._sources_cache = None
+        self._scenes_extract = None
+        self._sources_extract = None
+
+    def _parse_scenes(self, res) -> list[str]:
+        ext = self._scenes_extract
+        if ext is not None:
+            try:
+                return ext(res.getScenes())
+            except Exception:
+                self._scenes_extract = None
+        scenes = res.getScenes() if hasattr(res, "getScenes") else []  # type: ignore[attr-defined]
+        self._scenes_extract = _names_extractor(scenes, ("name", "sceneName"))
+        return _scene_names(scenes)
+
+    def _parse_sources(self, res) -> list[str]:
+        ext = self._sources_extract
+        if ext is not None:
+            try:
+                return ext(res.getSources())
+            except Exception:
+                self._sources_extract = None
+        sources = res.getSources() if hasattr(res, "getSources") else []  # type: ignore[attr-defined]
+        self._sources_extract = _names_extractor(sources, ("name",))
+        return _source_names(sources)
+
+    def _store_names(self, gen: int, scenes: Optional[list[str]] = None, sources: Optional[list[str]] = None) -> None:
+        # Results fetched before a change event arrived are not cached
+        if gen != self._meta_gen:
+            return
+        if scenes is not None and self._scenes_evt:
+            self._scenes_cache = list(scenes)
+        if sources is not None and self._sources_evt:
+            self._sources_cache = list(sources)
 
     def disconnect(self) -> None:
+        self._want_connected = False
+        if self._keepalive_stop is not None:
+            self._keepalive_stop.set()
+            self._keepalive_stop = None
         with self._lock:
             try:
                 self._ws.disconnect()
             except Exception:
                 pass
 
-    # --- Scenes ---
-    def list_scenes(self) -> list[str]:
-        """Return a list of scene names."""
+    # --- Session upkeep ---
+    def _sock_connected(self) -> bool:
+        sock = getattr(self._ws, "ws", None)
+        return sock is not None and bool(getattr(sock, "connected", True))
+
+    def _reconnect(self, seen_gen: int, max_attempts: int = 1) -> None:
+        """Replace the socket, unless another caller already did since ``seen_gen``.
+
+        A single connect attempt by default: this runs on whichever thread made
+        the request (the Tk thread included), so it fails fast instead of
+        sleeping through the backoff; the keepalive thread retries with backoff.
+        """
+        with self._reconnect_lock:
+            if self._reconnecting or not self._want_connected or self._conn_gen != seen_gen:
+                return
+            self._reconnecting = True
+            try:
+                with self._lock:
+                    try:
+                        self._ws.disconnect()
+                    except Exception:
+                        pass
+                answers = getattr(self._ws, "answers", None)
+                if isinstance(answers, _AnswerMap):
+                    answers.fail_all(ConnectionError("OBS connection was reset"))
+                self.connect(max_attempts=max_attempts)
+            finally:
+                self._reconnecting = False
+
+    def _start_keepalive(self) -> None:
+        if self._keepalive_stop is not None:
+            return
+        try:
+            interval = float(os.getenv("OBS_KEEPALIVE_SEC", "30") or 30)
+        except Exception:
+            interval = 30.0
+        req = _REQ_CAPS["GetVersion"]
+        if interval <= 0 or req is None:
+            return
+        stop = self._keepalive_stop = threading.Event()
+
+        def _loop() -> None:
+            while not stop.wait(interval):
+                gen = self._conn_gen
+                try:
+                    self._send_and_wait(_pooled(req))
+                except Exception:
+                    # No answer at all: treat the socket as dead (off the UI
+                    # thread, so the full backoff is fine here)
+                    try:
+                        self._reconnect(gen, max_attempts=6)
+                    except Exception:
+                        pass
+
+        threading.Thread(target=_loop, name="obs-keepalive", daemon=True).start()
+
+    # --- Request dispatch ---
+    def _send(self, req) -> tuple[Optional[str], Future]:
+        """Put ``req`` on the wire; return its message id and a future for it.
+
+        Only the id assignment and the socket write happen under the lock; the
+        future completes with ``req`` once the receive thread stores its reply.
+        Until then the request holds ``_rw``: shared for queries, exclusive for
+        requests in ``_WRITE_REQUESTS``, so state changes never overlap reads.
+        Taking the hold is bounded by the request timeout (``_MessageTimeout``).
+        Falls back to a fully serialized ``obsws.call`` when the library does
+        not expose the pieces needed for pipelining.
+        """
+        if self._want_connected and not self._reconnecting and not self._sock_connected():
+            self._reconnect(self._conn_gen)
+        ws = self._ws
+        answers = getattr(ws, "answers", None)
+        sock = getattr(ws, "ws", None)
+        # Copied: it is edited below and some library versions return dataout itself
+        payload = dict(req.data())
+        # The type comes from the request's name: obs-websocket-py 0.5 also
+        # embeds it in data(), 1.x only adds it in obsws.send
+        embedded = payload.pop("request-type", None)
+        rtype = getattr(req, "name", None) or embedded
+        fut: Future = Future()
+        # Bounded like the reply wait: a hold stuck behind a dead socket must not
+        # hang callers (or the keepalive that would detect it) forever
+        tmo = float(getattr(ws, "timeout", 60) or 60)
+        if type(req).__name__ in _WRITE_REQUESTS:
+            if not self._rw.acquire_write(tmo):
+                raise _MessageTimeout(f"{rtype or type(req).__name__}: timed out waiting for pending requests")
+            fut.add_done_callback(lambda _f: self._rw.release_write())
+        else:
+            if not self._rw.acquire_read(tmo):
+                raise _MessageTimeout(f"{rtype or type(req).__name__}: timed out waiting for a state change")
+            fut.add_done_callback(lambda _f: self._rw.release_read())
+        if not isinstance(answers, _AnswerMap) or sock is None or not rtype:
+            try:
+                with self._lock:
+                    fut.set_result(ws.call(req))
+            except Exception as e:
+                fut.set_exception(e)
+            return None, fut
+
         with self._lock:
-            res = self._ws.call(requests.GetSceneList())
-        scenes = res.getScenes() if hasattr(res, "getScenes") else []  # type: ignore[attr-defined]
-        out: list[str] = []
-        for s in scenes:
+            ws.id += 1
+            message_id = str(ws.id)
+            if getattr(ws, "legacy", True) is False:
+                # obs-websocket v5 request frame
+                frame = {"op": 6, "d": {"requestType": rtype, "requestId": message_id, "requestData": payload}}
+            else:
+                payload["request-type"] = rtype
+                payload["message-id"] = message_id
+                frame = payload
+            answers.waiters[message_id] = (req, fut)
             try:
-                name = s.get("name") or s.get("sceneName")  # type: ignore[index]
-                if isinstance(name, str):
-                    out.append(name)
+                sock.send(_json_dumps(frame))
             except Exception:
-                continue
-        return out
+                answers.waiters.pop(message_id, None)
+                fut.cancel()
+                raise
+        return message_id, fut
 
-    def set_current_scene(self, scene_name: str) -> None:
-        with self._lock:
-            self._ws.call(requests.SetCurrentScene(scene_name))
+    def _request_batch_v5(self, request_types: tuple[str, ...]) -> Optional[list[dict]]:
+        """Send one obs-websocket v5 ``RequestBatch``; return each request's data.
 
-    # --- Sources ---
-    def list_sources(self) -> list[str]:
-        """Return a list of source names (OBS v4 API)."""
+        Returns None when batching is not usable here (v4 server, library
+        without pipelining, or a library that does not route batch replies),
+        or when any request in the batch failed.
+        """
+        ws = self._ws
+        answers = getattr(ws, "answers", None)
+        sock = getattr(ws, "ws", None)
+        if (
+            type(ws) in _V5_BATCH_UNROUTED
+            or getattr(ws, "legacy", True) is not False
+            or not isinstance(answers, _AnswerMap)
+            or sock is None
+        ):
+            return None
+        holder = _RawReply()
+        fut: Future = Future()
+        if not self._rw.acquire_read(min(5.0, float(getattr(ws, "timeout", 60) or 60))):
+            return None
+        fut.add_done_callback(lambda _f: self._rw.release_read())
         with self._lock:
-            res = self._ws.call(requests.GetSourcesList())
-        sources = res.getSources() if hasattr(res, "getSources") else []  # type: ignore[attr-defined]
-        out: list[str] = []
-        for s in sources:
+            ws.id += 1
+            message_id = str(ws.id)
+            frame = {
+                "op": 8,
+                "d": {
+                    "requestId": message_id,
+                    "haltOnFailure": False,
+                    "requests": [{"requestType": t} for t in request_types],
+                },
+            }
+            answers.waiters[message_id] = (holder, fut)
             try:
-                name = s.get("name")  # type: ignore[index]
-                if isinstance(name, str):
-                    out.append(name)
+                sock.send(_json_dumps(frame))
             except Exception:
-                continue
-        return out
-
-    # --- Recording ---
-    def start_recording(self) -> None:
-        """Start recording with compatibility across OBS websocket variants."""
-        # v4
+                answers.waiters.pop(message_id, None)
+                fut.cancel()
+                raise
         try:
-            with self._lock:
-                self._ws.call(requests.StartRecording())
-            return
+            fut.result(timeout=min(5.0, float(getattr(ws, "timeout", 60) or 60)))
         except Exception:
-            pass
-        # v5 compat (some forks expose StartRecord)
+            self._abandon(message_id, fut)
+            _V5_BATCH_UNROUTED.add(type(ws))
+            return None
+        results = (holder.datain or {}).get("results")
+        if not isinstance(results, list) or len(results) != len(request_types):
+            return None
+        out: list[dict] = []
+        for r in results:
+            if not isinstance(r, dict) or not (r.get("requestStatus") or {}).get("result"):
+                return None
+            out.append(r.get("responseData") or {})
+        return out
+
+    def _abandon(self, message_id: Optional[str], fut: Future) -> None:
+        """Forget a request whose reply is no longer awaited; frees its lock hold."""
+        answers = getattr(self._ws, "answers", None)
+        if message_id is not None and isinstance(answers, _AnswerMap):
+            answers.abandon(message_id)
+        fut.cancel()
+
+    def _wait(self, message_id: Optional[str], fut: Future):
         try:
-            req = getattr(requests, "StartRecord", None)
-            if req is not None:
-                with self._lock:
-                    self._ws.call(req())
-                return
+            return fut.result(timeout=float(getattr(self._ws, "timeout", 60) or 60))
         except Exception:
-            pass
-        # v4/v5: TriggerHotkeyByName fallback
+            self._abandon(message_id, fut)
+            raise
+
+    def _send_and_wait(self, req):
+        """Send ``req`` and block until its reply arrives; return ``req``.
+
+        A query whose socket dropped is retried once on a fresh connection;
+        state-changing requests are not, since OBS may already have run them.
+        """
+        gen = self._conn_gen
         try:
-            req = getattr(requests, "TriggerHotkeyByName", None)
-            if req is not None:
-                with self._lock:
-                    # OBS internal hotkey names
-                    self._ws.call(req(hotkeyName="OBSBasic.StartRecording"))
-                return
-        except Exception:
-            pass
-        # v4 toggle fallback when state unknown
+            return self._wait(*self._send(req))
+        except _CONN_ERRORS:
+            if type(req).__name__ in _WRITE_REQUESTS or self._reconnecting or not self._want_connected:
+                raise
+        self._reconnect(gen)
+        return self._wait(*self._send(req))
+
+    def call_sync(self, req):
+        """Blocking request; same as the helpers below use internally."""
+        return self._send_and_wait(req)
+
+    async def call_async(self, req):
+        """Awaitable request for callers running an asyncio loop.
+
+        The send itself runs in a worker thread: it may reconnect, wait for
+        ``_rw`` (a write holds it across its whole round-trip) or fall back to a
+        blocking ``obsws.call``. The reply future is then bridged into the
+        running loop, so the loop thread never blocks on OBS.
+        """
+        send = asyncio.ensure_future(asyncio.to_thread(self._send, req))
         try:
-            req = getattr(requests, "StartStopRecording", None) or getattr(requests, "ToggleRecording", None)
-            if req is not None:
-                with self._lock:
-                    self._ws.call(req())
-                return
-        except Exception:
-            pass
-        # Last resort: try generic call name if available
+            message_id, fut = await asyncio.shield(send)
+        except asyncio.CancelledError:
+            # The worker still finishes the send; drop the reply when it does
+            def _drop(t: "asyncio.Future") -> None:
+                if not t.cancelled() and t.exception() is None:
+                    self._abandon(*t.result())
+
+            send.add_done_callback(_drop)
+            raise
         try:
-            req = getattr(requests, "StartRecording", None)
-            if req is not None:
-                with self._lock:
-                    self._ws.call(req())
-                return
-        except Exception:
-            pass
-        # If none succeeded, raise
-        raise RuntimeError("Failed to start recording via obs-websocket")
+            return await asyncio.wait_for(
+                asyncio.wrap_future(fut), timeout=float(getattr(self._ws, "timeout", 60) or 60)
+            )
+        except BaseException:
+            self._abandon(message_id, fut)
+            raise
+
+    # --- Metadata ---
+    def refresh_metadata(self) -> ObsSnapshot:
+        """Fetch scene names, source names and recording state together.
+
+        Uses one batched round-trip when the server allows it (v5
+        ``RequestBatch`` or v4 ``ExecuteBatch``); otherwise the requests are
+        pipelined on the socket and awaited together.
+        Name lists still valid in the event-invalidated cache are not re-fetched.
+        """
+        cached_scenes, cached_sources = self._scenes_cache, self._sources_cache
+        if cached_scenes is not None and cached_sources is not None:
+            return ObsSnapshot(list(cached_scenes), list(cached_sources), self.is_recording())
+        gen = self._meta_gen
+        if self._proto != 4:
+            try:
+                results = self._request_batch_v5(("GetSceneList", "GetInputList", "GetRecordStatus"))
+            except Exception:
+                results = None
+            if results is not None:
+                inputs = results[1].get("inputs")
+                snap = ObsSnapshot(
+                    _scene_names(results[0].get("scenes")),
+                    [i["inputName"] for i in inputs or [] if isinstance(i, dict) and isinstance(i.get("inputName"), str)],
+                    _recording_flag(results[2]),
+                )
+                self._store_names(gen, snap.scenes, snap.sources)
+                return snap
+        batch = _REQ_CAPS["ExecuteBatch"]
+        if batch is not None:
+            try:
+                res = self._send_and_wait(batch(requests=[
+                    {"request-type": "GetSceneList"},
+                    {"request-type": "GetSourcesList"},
+                    {"request-type": "GetStreamingStatus"},
+                ]))
+                results = (getattr(res, "datain", None) or {}).get("results")
+                if (
+                    isinstance(results, list)
+                    and len(results) == 3
+                    and all(isinstance(r, dict) and r.get("status") == "ok" for r in results)
+                ):
+                    snap = ObsSnapshot(
+                        _scene_names(results[0].get("scenes")),
+                        _source_names(results[1].get("sources")),
+                        _recording_flag(results[2]),
+                    )
+                    self._store_names(gen, snap.scenes, snap.sources)
+                    return snap
+            except Exception:
+                pass
+
+        pending = []
+        for cached, cls in ((cached_scenes, requests.GetSceneList), (cached_sources, requests.GetSourcesList)):
+            try:
+                pending.append(None if cached is not None else self._send(_pooled(cls)))
+            except Exception:
+                pending.append(None)
+        lists: list[Optional[list[str]]] = []
+        for cached, sent, getter, parse in zip(
+            (cached_scenes, cached_sources), pending, ("getScenes", "getSources"), (self._parse_scenes, self._parse_sources)
+        ):
+            if cached is not None:
+                lists.append(list(cached))
+                continue
+            try:
+                res = self._wait(*sent) if sent is not None else None
+                lists.append(parse(res) if hasattr(res, getter) else None)
+            except Exception:
+                lists.append(None)
+        # Only after the list replies: a new request taken while our own read
+        # holds are out could queue behind a waiting writer and never return
+        recording = self.is_recording()
+        self._store_names(gen, lists[0], lists[1])
+        return ObsSnapshot(lists[0] or [], lists[1] or [], recording)
+
+    # --- Scenes ---
+    def list_scenes(self) -> list[str]:
+        """Return a list of scene names."""
+        cached = self._scenes_cache
+        if cached is not None:
+            return list(cached)
+        gen = self._meta_gen
+        names = self._parse_scenes(self._send_and_wait(_pooled(requests.GetSceneList)))
+        self._store_names(gen, scenes=names)
+        return names
+
+    def set_current_scene(self, scene_name: str) -> None:
+        self._send_and_wait(requests.SetCurrentScene(scene_name))
+
+    # --- Sources ---
+    def list_sources(self) -> list[str]:
+        """Return a list of source names (OBS v4 API)."""
+        cached = self._sources_cache
+        if cached is not None:
+            return list(cached)
+        gen = self._meta_gen
+        names = self._parse_sources(self._send_and_wait(_pooled(requests.GetSourcesList)))
+        self._store_names(gen, sources=names)
+        return names
+
+    # --- Recording ---
+    def start_recording(self) -> None:
+        """Start recording with compatibility across OBS websocket variants.
+
+        Uses the request class detected at connect (or remembered from the last
+        success); the fallback ladder only runs when that is unknown or fails.
+        """
+        self._run_record_ladder(_START_ORDER, "_start_rec_cls", "start")
 
     def start_recording_diag(self) -> str:
         """Start recording and return the method name used.
@@ -126,138 +1234,93 @@ class ObsClient:
         Tries multiple strategies and returns a string label of the first
         that succeeded (no exception). Raises if all fail.
         """
-        # Optional preference via env
-        pref = (os.getenv("OBS_RECORD_METHOD", "") or "").strip().lower()
-
-        def _try(name: str, kwargs: Optional[dict] = None) -> bool:
-            cls = getattr(requests, name, None)
-            if cls is None:
-                return False
-            with self._lock:
-                self._ws.call(cls(**(kwargs or {})))
-            return True
-
-        tried: list[str] = []
-        # Preferred
-        if pref in ("startrecord", "v5") and _try("StartRecord"):
-            return "StartRecord"
-        if pref in ("startrecording", "v4") and _try("StartRecording"):
-            return "StartRecording"
-        if pref in ("hotkey",):
-            if _try("TriggerHotkeyByName", {"hotkeyName": "OBSBasic.StartRecording"}):
-                return "TriggerHotkeyByName"
-        if pref in ("toggle",):
-            if _try("StartStopRecording") or _try("ToggleRecording"):
-                return "ToggleRecording"
-
-        # Normal order: v5 -> v4 -> hotkey -> toggle
-        if _try("StartRecord"):
-            return "StartRecord"
-        if _try("StartRecording"):
-            return "StartRecording"
-        if _try("TriggerHotkeyByName", {"hotkeyName": "OBSBasic.StartRecording"}):
-            return "TriggerHotkeyByName"
-        if _try("StartStopRecording") or _try("ToggleRecording"):
-            return "ToggleRecording"
-        raise RuntimeError("Failed to start recording via obs-websocket (all methods)")
+        return self._run_record_diag(_START_DIAG_ORDER, "start")
 
     def stop_recording(self) -> None:
-        """Stop recording with compatibility across OBS websocket variants."""
-        # v4
-        try:
-            with self._lock:
-                self._ws.call(requests.StopRecording())
-            return
-        except Exception:
-            pass
-        # v5 compat (some forks expose StopRecord)
-        try:
-            req = getattr(requests, "StopRecord", None)
-            if req is not None:
-                with self._lock:
-                    self._ws.call(req())
-                return
-        except Exception:
-            pass
-        # Try again v4 in case transient
-        try:
-            with self._lock:
-                self._ws.call(requests.StopRecording())
-            return
-        except Exception:
-            pass
-        # v4/v5: TriggerHotkeyByName fallback
-        try:
-            req = getattr(requests, "TriggerHotkeyByName", None)
-            if req is not None:
-                with self._lock:
-                    self._ws.call(req(hotkeyName="OBSBasic.StopRecording"))
-                return
-        except Exception:
-            pass
-        # v4 toggle fallback when state unknown
-        try:
-            req = getattr(requests, "StartStopRecording", None) or getattr(requests, "ToggleRecording", None)
-            if req is not None:
-                with self._lock:
-                    self._ws.call(req())
-                return
-        except Exception:
-            pass
-        raise RuntimeError("Failed to stop recording via obs-websocket")
+        """Stop recording with compatibility across OBS websocket variants.
+
+        Mirrors start_recording: the detected/remembered request goes first.
+        """
+        self._run_record_ladder(_STOP_ORDER, "_stop_rec_cls", "stop")
 
     def stop_recording_diag(self) -> str:
         """Stop recording and return the method name used."""
-        pref = (os.getenv("OBS_RECORD_METHOD", "") or "").strip().lower()
+        return self._run_record_diag(_STOP_DIAG_ORDER, "stop")
 
-        def _try(name: str, kwargs: Optional[dict] = None) -> bool:
-            cls = getattr(requests, name, None)
-            if cls is None:
-                return False
-            with self._lock:
-                self._ws.call(cls(**(kwargs or {})))
-            return True
+    def _run_record_ladder(self, order, memo_attr: str, action: str) -> None:
+        cls = getattr(self, memo_attr)
+        if cls is not None:
+            try:
+                self._send_and_wait(_pooled(cls))
+                return
+            except _OBS_ERRORS:
+                setattr(self, memo_attr, None)
+        for name, kwargs, remember in order:
+            req = _REQ_CAPS[name]
+            if req is None:
+                continue
+            try:
+                self._send_and_wait(req(**kwargs) if kwargs else _pooled(req))
+            except _OBS_ERRORS:
+                continue
+            if remember:
+                setattr(self, memo_attr, req)
+            return
+        raise RuntimeError(f"Failed to {action} recording via obs-websocket")
 
-        if pref in ("startrecord", "v5") and _try("StopRecord"):
-            return "StopRecord"
-        if pref in ("startrecording", "v4") and _try("StopRecording"):
-            return "StopRecording"
-        if pref in ("hotkey",):
-            if _try("TriggerHotkeyByName", {"hotkeyName": "OBSBasic.StopRecording"}):
-                return "TriggerHotkeyByName"
-        if pref in ("toggle",):
-            if _try("StartStopRecording") or _try("ToggleRecording"):
-                return "ToggleRecording"
-
-        if _try("StopRecord"):
-            return "StopRecord"
-        if _try("StopRecording"):
-            return "StopRecording"
-        if _try("TriggerHotkeyByName", {"hotkeyName": "OBSBasic.StopRecording"}):
-            return "TriggerHotkeyByName"
-        if _try("StartStopRecording") or _try("ToggleRecording"):
-            return "ToggleRecording"
-        raise RuntimeError("Failed to stop recording via obs-websocket (all methods)")
+    def _run_record_diag(self, order, action: str) -> str:
+        # Optional preference via env (OBS_RECORD_METHOD) or the detected protocol;
+        # its entries go first.
+        # Errors from OBS propagate so the caller sees why a method failed.
+        group = _RECORD_METHOD_GROUPS.get(_REC_PREF)
+        if group is None:
+            # Without an override, the detected protocol's own request goes first
+            group = {5: "v5", 4: "v4"}.get(self._proto or 0)
+        entries = [e for e in order if e[3] == group] + list(order) if group else order
+        for name, kwargs, label, _group in entries:
+            req = _REQ_CAPS[name]
+            if req is None:
+                continue
+            self._send_and_wait(req(**kwargs) if kwargs else _pooled(req))
+            return label
+        raise RuntimeError(f"Failed to {action} recording via obs-websocket (all methods)")
 
     def is_recording(self) -> Optional[bool]:
         """Return True if recording is active, False if not, or None if unknown."""
+        probe = self._rec_probe
+        if probe is not None:
+            req, key = probe
+            try:
+                v = (getattr(self._send_and_wait(_pooled(req)), "datain", None) or {}).get(key)
+                if isinstance(v, bool):
+                    return v
+            except Exception:
+                pass
+            self._rec_probe = None
+        return self._probe_recording()
+
+    def _probe_recording(self) -> Optional[bool]:
+        """Full recording-state lookup; remembers the request/field that answered."""
         # v5: GetRecordStatus -> {"outputActive": bool}
         try:
-            req = getattr(requests, "GetRecordStatus", None)
+            req = _REQ_CAPS["GetRecordStatus"]
             if req is not None:
-                with self._lock:
-                    res = self._ws.call(req())
+                res = self._send_and_wait(_pooled(req))
                 d = getattr(res, "datain", {}) or {}
-                for k in ("outputActive", "recording", "isRecording"):
-                    v = d.get(k)
-                    if isinstance(v, bool):
-                        return v
+                k = _recording_key(d)
+                if k is not None:
+                    self._rec_probe = (req, k)
+                    return d[k]
         except Exception:
             pass
         # v4: GetStreamingStatus -> {"recording": bool}
         try:
-            with self._lock:
-                res = self._ws.call(requests.GetStreamingStatus())
+            req = requests.GetStreamingStatus
+            res = self._send_and_wait(_pooled(req))
+            d = getattr(res, "datain", {}) or {}
+            if isinstance(d.get("recording"), bool):
+                self._rec_probe = (req, "recording")
+                return d["recording"]
             # Some versions expose getters
             for meth in ("getRecording", "getIsRecording"):
                 try:
@@ -267,10 +1330,6 @@ class ObsClient:
                         return v
                 except Exception:
                     pass
-            d = getattr(res, "datain", {}) or {}
-            v = d.get("recording")
-            if isinstance(v, bool):
-                return v
         except Exception:
             pass
         return None
@@ -284,15 +1343,27 @@ class ObsClient:
         - Local OBS config (global.ini + basic.ini) fallback
         - OS default videos directory as last resort
         Returns an absolute path string if available, otherwise None.
+
+        The result is cached for ``_REC_DIR_TTL`` seconds and dropped early
+        when any OBS ini file consulted for it changes on disk.
         """
+        cached = self._rec_dir_cache
+        if cached is not None and time.monotonic() - cached[0] < _REC_DIR_TTL:
+            if all(_mtime_ns(p) == m for p, m in self._rec_dir_mtime.items()):
+                return cached[1]
+        self._rec_dir_mtime = {}
+        folder = self._find_recordings_dir()
+        self._rec_dir_cache = (time.monotonic(), folder)
+        return folder
+
+    def _find_recordings_dir(self) -> Optional[str]:
+        # GetRecordingFolder exists only on v4, GetProfileParameter only on v5;
+        # with the protocol known, skip the request that would just fail
+        proto = self._proto
         # 1) Try GetRecordingFolder
         try:
-            with self._lock:
-                req = getattr(requests, "GetRecordingFolder", None)
-                if req is not None:
-                    res = self._ws.call(req())
-                else:
-                    res = None
+            req = _REQ_CAPS["GetRecordingFolder"] if proto != 5 else None
+            res = self._send_and_wait(_pooled(req)) if req is not None else None
             if res is not None:
                 d = getattr(res, "datain", None) or {}
                 if isinstance(d, dict):
@@ -314,12 +1385,11 @@ class ObsClient:
 
         # 2) Try profile parameter
         try:
-            with self._lock:
-                req = getattr(requests, "GetProfileParameter", None)
-                if req is not None:
-                    res = self._ws.call(req(parameterCategory="Output", parameterName="RecFilePath"))
-                else:
-                    res = None
+            req = _REQ_CAPS["GetProfileParameter"] if proto != 4 else None
+            if req is not None:
+                res = self._send_and_wait(req(parameterCategory="Output", parameterName="RecFilePath"))
+            else:
+                res = None
             if res is not None:
                 d = getattr(res, "datain", None) or {}
                 if isinstance(d, dict):
@@ -332,30 +1402,17 @@ class ObsClient:
 
         # 3) Try local OBS config files (works when OBS is on same machine)
         try:
-            root: Optional[Path]
-            if sys.platform.startswith("win"):
-                appdata = os.getenv("APPDATA") or ""
-                root = Path(appdata).joinpath("obs-studio") if appdata else None
-            elif sys.platform == "darwin":
-                root = Path.home().joinpath("Library", "Application Support", "obs-studio")
-            else:
-                root = Path.home().joinpath(".config", "obs-studio")
+            root = _OBS_CONFIG_ROOT
             if root and root.exists():
                 global_ini = root.joinpath("global.ini")
                 prof_name: Optional[str] = None
                 if global_ini.exists():
+                    self._rec_dir_mtime[global_ini] = _mtime_ns(global_ini)
                     try:
-                        cp = configparser.ConfigParser()
-                        cp.read(global_ini, encoding="utf-8")
                         # Try common keys across any section
-                        for sec in cp.sections():
-                            for k, v in cp.items(sec):
-                                kl = k.lower()
-                                if kl in ("lastprofile", "profile", "activeprofile", "currentprofile"):
-                                    if v and isinstance(v, str):
-                                        prof_name = v
-                                        break
-                            if prof_name:
+                        for kl, v in _ini_items(global_ini):
+                            if kl in ("lastprofile", "profile", "activeprofile", "currentprofile") and v:
+                                prof_name = v
                                 break
                     except Exception:
                         pass
@@ -369,28 +1426,27 @@ class ObsClient:
                         p = p2 if p2.exists() else p
                 else:
                     # Pick latest modified profile dir if any
+                    p = None  # type: ignore[assignment]
                     try:
-                        dirs = [d for d in prof_dir.iterdir() if d.is_dir()]
-                        if dirs:
-                            dirs.sort(key=lambda d: d.stat().st_mtime, reverse=True)
-                            p = dirs[0]
-                        else:
-                            p = None  # type: ignore[assignment]
+                        best_m = -1.0
+                        with os.scandir(prof_dir) as it:
+                            for e in it:
+                                if not e.is_dir():
+                                    continue
+                                m = e.stat().st_mtime
+                                if m > best_m:
+                                    best_m, p = m, Path(e.path)
                     except Exception:
                         p = None  # type: ignore[assignment]
                 if p:
                     basic_ini = p.joinpath("basic.ini")
                     if basic_ini.exists():
+                        self._rec_dir_mtime[basic_ini] = _mtime_ns(basic_ini)
                         try:
-                            cp2 = configparser.ConfigParser()
-                            cp2.read(basic_ini, encoding="utf-8")
                             candidates: list[str] = []
-                            for sec in cp2.sections():
-                                for k, v in cp2.items(sec):
-                                    kl = k.lower()
-                                    if any(x in kl for x in ("rec", "record", "file")) and any(y in kl for y in ("path", "dir")):
-                                        if isinstance(v, str) and v:
-                                            candidates.append(v)
+                            for kl, v in _ini_items(basic_ini):
+                                if v and _REC_KEY_RE.search(kl):
+                                    candidates.append(v)
                             # Normalize and pick an existing directory-like path
                             for c in candidates:
                                 try:
@@ -431,12 +1487,64 @@ class ObsClient:
 
     # --- Text Source ---
     def update_text_source(self, source_name: str, text: str) -> None:
-        with self._lock:
-            self._ws.call(
-                requests.SetSourceSettings(sourceName=source_name, sourceSettings={"text": text})
-            )
+        self._send_and_wait(
+            requests.SetSourceSettings(sourceName=source_name, sourceSettings={"text": text})
+        )
 
     # --- Screenshots ---
+    def _screenshot_b64_v5(self, source_name: str) -> Optional[str]:
+        """GetSourceScreenshot (v5) image data, or None when unavailable/failed."""
+        req_cls = _REQ_CAPS["GetSourceScreenshot"]
+        if req_cls is None or self._proto == 4:
+            return None
+        try:
+            kwargs = {"sourceName": source_name, "imageFormat": "png", "imageWidth": _SS_W, "imageHeight": _SS_H}
+            if _SS_QUALITY is not None:
+                kwargs["imageCompressionQuality"] = _SS_QUALITY
+            res = self._send_and_wait(req_cls(**kwargs))
+            d = getattr(res, "datain", {}) or {}
+            data = d.get("imageData") or d.get("img")
+            return str(data) if data else None
+        except Exception:
+            return None
+
+    def _screenshot_b64_v4(self, source_name: str) -> Optional[str]:
+        """TakeSourceScreenshot (v4) embedded image data, or None when unavailable/failed."""
+        if self._proto == 5:
+            return None
+        try:
+            res = self._send_and_wait(requests.TakeSourceScreenshot(sourceName=source_name, embedPictureFormat="png", width=None, height=None))
+            d = getattr(res, "datain", {}) or {}
+            data = d.get("img") or d.get("imageData")
+            return str(data) if data else None
+        except Exception:
+            return None
+
+    def take_screenshot_bytes(self, source_name: str) -> bytes:
+        """Return a PNG screenshot of a source in memory, without touching disk.
+
+        Only the base64 requests can return image data, so the OBS-side save
+        path is never used here. `OBS_SCREENSHOT_METHOD=v4/take` tries the
+        v4 request first; width/height/quality env vars apply as for files.
+        """
+        if _SS_PREF in ("v4", "take"):
+            data = self._screenshot_b64_v4(source_name) or self._screenshot_b64_v5(source_name)
+        else:
+            data = self._screenshot_b64_v5(source_name) or self._screenshot_b64_v4(source_name)
+        if not data:
+            raise ValueError("OBS did not return a screenshot image.")
+        body, start, end = _b64_span(data)
+        return binascii.a2b_base64(_b64_padded(body[start:end]))
+
+    def get_latest_frame(self, source_name: str, max_age: float = 0.05, flags: Optional[int] = None):
+        """Decoded BGR frame of a source, shared by callers within `max_age` seconds.
+
+        Captures with take_screenshot_bytes when the cached frame is older; `flags`
+        are cv2.imread flags (default IMREAD_COLOR). The array is shared: do not
+        modify it. Returns None if the image cannot be decoded.
+        """
+        return self._frames.get(self.take_screenshot_bytes, source_name, max_age, flags)
+
     def take_screenshot(self, source_name: str, save_path: str) -> None:
         """Take a screenshot of a source and write it to ``save_path``.
 
@@ -444,75 +1552,113 @@ class ObsClient:
         - file/save: use SaveSourceScreenshot first (reduces WebSocket payload)
         - v5/get/base64: use GetSourceScreenshot first
         - v4/take: use TakeSourceScreenshot first
-        Default: auto (file -> v5 -> v4)
+        Default: auto. For a local OBS: file -> v5 -> v4, since OBS can write
+        ``save_path`` itself and no image crosses the WebSocket. For a remote
+        OBS: v5 -> v4 -> file, because the file would land on the other host.
         Optional downscale with `OBS_SCREENSHOT_WIDTH`/`OBS_SCREENSHOT_HEIGHT` for v5.
         """
 
-        def _write_b64(data_uri_or_b64: str) -> bool:
+        def _write_b64(data_uri_or_b64) -> bool:
+            tmp = save_path + ".tmp"
             try:
-                s = data_uri_or_b64 or ""
-                if "," in s and s.lower().startswith("data:image"):
-                    s = s.split(",", 1)[1]
-                b = s.encode("utf-8")
-                pad = len(b) % 4
-                if pad:
-                    b += b"=" * (4 - pad)
-                img = base64.b64decode(b)
-                os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
-                with open(save_path, "wb") as f:
-                    f.write(img)
+                # str slices below are chunk-sized copies; bytes go through a memoryview
+                body, start, end = _b64_span(data_uri_or_b64 or b"")
+                # Decode in chunks straight into a temp file, then rename, so neither the
+                # whole decoded PNG is held in memory nor do watchers see a partial file
+                flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+                try:
+                    _ensure_dir(os.path.dirname(save_path))
+                    fd = os.open(tmp, flags, 0o644)
+                except FileNotFoundError:
+                    # Directory removed since it was first created
+                    _made_dirs.discard(os.path.dirname(save_path) or ".")
+                    _ensure_dir(os.path.dirname(save_path))
+                    fd = os.open(tmp, flags, 0o644)
+                try:
+                    # Size the file up front so it is allocated once, not grown per chunk
+                    expected = _b64_decoded_size(body, start, end)
+                    if expected > 0:
+                        try:
+                            os.ftruncate(fd, expected)
+                        except OSError:
+                            expected = 0
+                    written = 0
+                    pos = start
+                    while pos < end:
+                        chunk = body[pos:min(pos + _B64_CHUNK, end)]
+                        pos += _B64_CHUNK
+                        if pos >= end:
+                            chunk = _b64_padded(chunk)
+                        view = memoryview(binascii.a2b_base64(chunk))
+                        written += len(view)
+                        while view:
+                            view = view[os.write(fd, view):]
+                    if expected and written != expected:
+                        os.ftruncate(fd, written)
+                finally:
+                    os.close(fd)
+                os.replace(tmp, save_path)
                 return True
             except Exception:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
                 return False
 
-        pref = (os.getenv("OBS_SCREENSHOT_METHOD", "") or "").strip().lower()
+        pref = _SS_PREF
+        quality = _SS_QUALITY
+
+        # Requests of the other protocol would only fail; skip them once the version is known
+        proto = self._proto
 
         def _try_v5_get() -> bool:
-            try:
-                req_cls = getattr(requests, "GetSourceScreenshot", None)
-                if req_cls is None:
-                    return False
-                try:
-                    w = int(os.getenv("OBS_SCREENSHOT_WIDTH", "0") or 0)
-                except Exception:
-                    w = 0
-                try:
-                    h = int(os.getenv("OBS_SCREENSHOT_HEIGHT", "0") or 0)
-                except Exception:
-                    h = 0
-                with self._lock:
-                    res = self._ws.call(req_cls(sourceName=source_name, imageFormat="png", imageWidth=w, imageHeight=h))
-                d = getattr(res, "datain", {}) or {}
-                data = d.get("imageData") or d.get("img")
-                return bool(data and _write_b64(str(data)))
-            except Exception:
-                return False
+            data = self._screenshot_b64_v5(source_name)
+            return bool(data and _write_b64(data))
 
         def _try_v4_take() -> bool:
-            try:
-                with self._lock:
-                    res = self._ws.call(requests.TakeSourceScreenshot(sourceName=source_name, embedPictureFormat="png", width=None, height=None))
-                d = getattr(res, "datain", {}) or {}
-                data = d.get("img") or d.get("imageData")
-                return bool(data and _write_b64(str(data)))
-            except Exception:
-                return False
+            data = self._screenshot_b64_v4(source_name)
+            return bool(data and _write_b64(data))
 
         def _try_v4_save() -> bool:
             try:
-                req_cls = getattr(requests, "SaveSourceScreenshot", None)
-                if req_cls is None:
-                    return False
-                for kwargs in (
-                    {"sourceName": source_name, "imageFormat": "png", "imageFilePath": save_path},
-                    {"sourceName": source_name, "imageFormat": "png", "saveToFilePath": save_path},
-                ):
+                # (request class, path arg, format arg, quality arg)
+                attempts: list[tuple[type, str, str, str]] = []
+                req_cls = _REQ_CAPS["SaveSourceScreenshot"]
+                if req_cls is not None and proto != 4:
+                    attempts.append((req_cls, "imageFilePath", "imageFormat", "imageCompressionQuality"))
+                    attempts.append((req_cls, "saveToFilePath", "imageFormat", "imageCompressionQuality"))
+                take_cls = _REQ_CAPS["TakeSourceScreenshot"]
+                if take_cls is not None and proto != 5:
+                    # v4 plugin: TakeSourceScreenshot writes the file itself when given saveToFilePath
+                    take = (take_cls, "saveToFilePath", "fileFormat", "compressionQuality")
+                    attempts.insert(0 if self._proto == 4 else len(attempts), take)
+                # Whatever worked last time goes first
+                if self._shot_save in attempts:
+                    attempts.remove(self._shot_save)
+                    attempts.insert(0, self._shot_save)
+                # OBS writes next to the target and the finished file is renamed into
+                # place, so readers never see a half-written PNG at save_path
+                root, ext = os.path.splitext(os.path.abspath(save_path))
+                obs_tmp = f"{root}.obs-tmp{ext or '.png'}"
+                _ensure_dir(os.path.dirname(obs_tmp))
+                for attempt in attempts:
+                    cls, path_key, fmt_key, quality_key = attempt
+                    kwargs = {"sourceName": source_name, path_key: obs_tmp, fmt_key: "png"}
+                    if quality is not None:
+                        kwargs[quality_key] = quality
+                    # A file left over from an earlier capture must not count as success
                     try:
-                        with self._lock:
-                            self._ws.call(req_cls(**kwargs))
-                        if os.path.exists(save_path) and os.path.getsize(save_path) > 0:
+                        os.remove(obs_tmp)
+                    except OSError:
+                        pass
+                    try:
+                        self._send_and_wait(cls(**kwargs))
+                        if os.path.exists(obs_tmp) and os.path.getsize(obs_tmp) > 0:
+                            _publish_file(obs_tmp, save_path)
+                            self._shot_save = attempt
                             return True
-                    except Exception:
+                    except _OBS_ERRORS:
                         continue
             except Exception:
                 pass
@@ -531,8 +1677,16 @@ class ObsClient:
                 return
             raise ValueError("OBS did not return a screenshot image (pref=v4)")
 
-        # Auto: file first to reduce payload, then v5, then v4
-        if _try_v4_save() or _try_v5_get() or _try_v4_take():
+        # Auto: let a local OBS write the file; pull base64 from a remote one.
+        # Once OBS has saved into our paths, a local OBS never goes through base64.
+        if self._is_local:
+            if self._shot_save is not None:
+                if _try_v4_save():
+                    return
+                raise ValueError("OBS did not save the screenshot file.")
+            if _try_v4_save() or _try_v5_get() or _try_v4_take():
+                return
+        elif _try_v5_get() or _try_v4_take() or _try_v4_save():
             return
         raise ValueError("OBS did not return a screenshot image.")
 
@@ -542,6 +1696,108 @@ class ObsClient:
         return self._ws
 
     @property
-    def lock(self) -> threading.Lock:
+    def lock(self) -> threading.RLock:
         return self._lock
 
+
+class ObsClientPool:
+    """Several OBS sessions so screenshots from different workers overlap.
+
+    - ``take_screenshot`` checks an idle session out of a queue, so at most
+      ``size`` captures run at once and each uses its own socket. If none
+      frees up within ``_POOL_WAIT_SEC`` (e.g. a wedged session), the control
+      session is used instead of blocking.
+    - Sessions carry the pool generation they were handed out under; ones
+      returned after a disconnect/reconnect are dropped, not re-queued.
+    - Everything else (recording control, scenes, text updates) goes to the
+      first session, exposed as ``control``; the pool otherwise behaves like
+      an ObsClient.
+    """
+
+    def __init__(self, host: str, port: int, password: str, size: int = 4, lock: Optional[threading.RLock] = None) -> None:
+        self._host, self._port, self._password = host, port, password
+        self._size = max(1, int(size))
+        self._control = ObsClient(host, port, password, lock)
+        self._clients: list[ObsClient] = [self._control]
+        self._idle: "queue.Queue[tuple[int, ObsClient]]" = queue.Queue()
+        self._gen = 0
+        self._connected = False
+        self._frames = _LatestFrames()
+
+    @property
+    def control(self) -> ObsClient:
+        return self._control
+
+    def connect(self, max_attempts: int = 6) -> None:
+        self._control.connect(max_attempts=max_attempts)
+        self._gen += 1
+        gen = self._gen
+        self._idle.put((gen, self._control))
+        for _ in range(self._size - 1):
+            c = ObsClient(self._host, self._port, self._password)
+            try:
+                c.connect(max_attempts=1)
+            except Exception:
+                # Extra sessions are best-effort; the pool keeps what connected
+                continue
+            self._clients.append(c)
+            self._idle.put((gen, c))
+        self._connected = True
+
+    def disconnect(self) -> None:
+        self._connected = False
+        # Sessions still checked out see a stale generation when returned
+        self._gen += 1
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        for c in self._clients:
+            try:
+                c.disconnect()
+            except Exception:
+                pass
+        self._clients = [self._control]
+
+    def _checkout(self) -> Optional[tuple[int, ObsClient]]:
+        deadline = time.monotonic() + _POOL_WAIT_SEC
+        while True:
+            try:
+                item = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return None
+            if item[0] == self._gen:
+                return item
+
+    def _checkin(self, item: tuple[int, ObsClient]) -> None:
+        if self._connected and item[0] == self._gen:
+            self._idle.put(item)
+
+    def take_screenshot(self, source_name: str, save_path: str) -> None:
+        item = self._checkout() if self._connected else None
+        if item is None:
+            self._control.take_screenshot(source_name, save_path)
+            return
+        try:
+            item[1].take_screenshot(source_name, save_path)
+        finally:
+            self._checkin(item)
+
+    def take_screenshot_bytes(self, source_name: str) -> bytes:
+        item = self._checkout() if self._connected else None
+        if item is None:
+            return self._control.take_screenshot_bytes(source_name)
+        try:
+            return item[1].take_screenshot_bytes(source_name)
+        finally:
+            self._checkin(item)
+
+    def get_latest_frame(self, source_name: str, max_age: float = 0.05, flags: Optional[int] = None):
+        return self._frames.get(self.take_screenshot_bytes, source_name, max_age, flags)
+
+    def __getattr__(self, name: str):
+        # Control-plane calls and low-level access go to the first session
+        if name == "_control":
+            raise AttributeError(name)
+        return getattr(self._control, name)
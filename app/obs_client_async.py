@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import Optional
+
+from obswebsocket import requests  # type: ignore
+
+from app.obs_client import ObsClient, ObsSnapshot
+
+
+class AsyncObsClient:
+    """asyncio facade over :class:`ObsClient` with the same method surface.
+
+    - Single-request calls are awaited on the pipelined socket
+      (``ObsClient.call_async``), so many can be in flight from one loop.
+    - Multi-step helpers (recording fallbacks, screenshot methods, recordings
+      dir lookup) run in a worker thread so they never block the loop.
+    - No asyncio.Lock is needed: the send (which may reconnect or wait for
+      the client's read/write lock) runs in a worker thread, and only the
+      reply is awaited on the loop.
+    """
+
+    def __init__(self, host: str, port: int, password: str, lock: Optional[threading.RLock] = None) -> None:
+        self._client = ObsClient(host, port, password, lock)
+
+    @property
+    def sync(self) -> ObsClient:
+        """The wrapped blocking client, for code that is not async."""
+        return self._client
+
+    async def connect(self) -> None:
+        await asyncio.to_thread(self._client.connect)
+
+    async def disconnect(self) -> None:
+        await asyncio.to_thread(self._client.disconnect)
+
+    async def call(self, req):
+        """Send any obswebsocket request object and await its reply."""
+        return await self._client.call_async(req)
+
+    # --- Metadata ---
+    async def refresh_metadata(self) -> ObsSnapshot:
+        return await asyncio.to_thread(self._client.refresh_metadata)
+
+    async def list_scenes(self) -> list[str]:
+        return await asyncio.to_thread(self._client.list_scenes)
+
+    async def list_sources(self) -> list[str]:
+        return await asyncio.to_thread(self._client.list_sources)
+
+    async def set_current_scene(self, scene_name: str) -> None:
+        await self._client.call_async(requests.SetCurrentScene(scene_name))
+
+    # --- Recording ---
+    async def start_recording(self) -> None:
+        await asyncio.to_thread(self._client.start_recording)
+
+    async def start_recording_diag(self) -> str:
+        return await asyncio.to_thread(self._client.start_recording_diag)
+
+    async def stop_recording(self) -> None:
+        await asyncio.to_thread(self._client.stop_recording)
+
+    async def stop_recording_diag(self) -> str:
+        return await asyncio.to_thread(self._client.stop_recording_diag)
+
+    async def is_recording(self) -> Optional[bool]:
+        return await asyncio.to_thread(self._client.is_recording)
+
+    async def wait_recording_state(self, want: bool, timeout: float) -> Optional[bool]:
+        return await asyncio.to_thread(self._client.wait_recording_state, want, timeout)
+
+    async def get_recordings_dir(self) -> Optional[str]:
+        return await asyncio.to_thread(self._client.get_recordings_dir)
+
+    # --- Text / screenshots ---
+    async def update_text_source(self, source_name: str, text: str) -> None:
+        await self._client.call_async(
+            requests.SetSourceSettings(sourceName=source_name, sourceSettings={"text": text})
+        )
+
+    async def take_screenshot(self, source_name: str, save_path: str) -> None:
+        await asyncio.to_thread(self._client.take_screenshot, source_name, save_path)
+
+    async def take_screenshot_bytes(self, source_name: str) -> bytes:
+        return await asyncio.to_thread(self._client.take_screenshot_bytes, source_name)
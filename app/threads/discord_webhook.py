@@ -2,27 +2,46 @@ from __future__ import annotations
 
 import mimetypes
 import os
+import queue
+import stat
 import threading
+from collections import OrderedDict
 import time
 import json
 from typing import Optional, Set
 
 from app.utils.logging import UiLogger
 from app.utils import paths as paths_utils
+from app.utils.dirwatch import DirWatcher
 
 try:
     # Use stdlib to avoid extra dependency
-    from urllib import request, error
+    import http.client as http_client
+    from urllib.parse import urlsplit
 except Exception:  # pragma: no cover
-    request = None  # type: ignore
-    error = None  # type: ignore
+    http_client = None  # type: ignore
+    urlsplit = None  # type: ignore
+
+_EXTS = {"png", "jpg", "jpeg", "webp"}
+_SEND_CHUNK = 64 * 1024
+# Posted paths remembered to suppress duplicate events / rescans
+_SEEN_MAX = 4096
+# Discord accepts up to 10 attachments per message; keep a batch under the
+# default (non-boosted) upload cap so a burst does not turn into HTTP 413
+_BATCH_FILES = 10
+_BATCH_BYTES = 10 * 1024 * 1024
 
 
 class DiscordWebhookThread(threading.Thread):
     """Watch `koutiku` folder and POST new images to a Discord webhook.
 
-    - Uses polling (every 2s) to detect new files with extensions png/jpg/jpeg/webp.
-    - Tracks files seen during the current run to avoid duplicates.
+    - Waits on OS change notifications (inotify / ReadDirectoryChangesW) for new
+      png/jpg/jpeg/webp files; falls back to polling every 2s when unavailable.
+    - Only files created/changed after the thread started are posted; posted
+      paths are kept in a bounded LRU to avoid duplicates.
+    - Uploads run on a separate worker fed by a queue, so a slow or failing post
+      never stalls detection; files that arrive together are sent as one
+      message (up to 10 attachments).
     - Requires `webhook_url` to be a valid Discord webhook URL.
     """
 
@@ -34,168 +53,417 @@ class DiscordWebhookThread(threading.Thread):
         self._url = (webhook_url or "").strip()
         self._log = logger or UiLogger()
         self._stop = threading.Event()
-        self._seen: Set[str] = set()
+        # path -> change time of posted files, oldest first (bounded)
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        # Files changed at or before this time are never posted
+        self._start_ts = 0.0
+        # Rescans skip files at or before this time (raised as _seen evicts)
+        self._since = 0.0
+        self._watcher: Optional[DirWatcher] = None
+        # One keep-alive connection to the webhook host, reused across posts
+        self._conn = None
+        self._conn_used = False
+        # monotonic time before which posting is paused after HTTP 429
+        self._retry_at = 0.0
+        # Stable files handed to the uploader thread as (ts, size, path); None stops it
+        self._queue: "queue.Queue[Optional[tuple]]" = queue.Queue()
+        # Paths queued or being retried by the uploader; guarded with _seen by _seen_lock
+        self._queued: Set[str] = set()
+        self._seen_lock = threading.Lock()
+        # Multipart framing is constant per thread; only payload/filename vary
+        boundary = b"----obsboundary" + os.urandom(12).hex().encode("ascii")
+        sep = b"--" + boundary + b"\r\n"
+        self._payload_head = (
+            sep
+            + b"Content-Disposition: form-data; name=\"payload_json\"\r\n"
+            + b"Content-Type: application/json; charset=utf-8\r\n\r\n"
+        )
+        self._file_heads = tuple(
+            sep + b"Content-Disposition: form-data; name=\"files[%d]\"; filename=\"" % i
+            for i in range(_BATCH_FILES)
+        )
+        self._part_end = b"\r\n--" + boundary + b"--\r\n"
+        self._content_type = "multipart/form-data; boundary=" + boundary.decode("ascii")
 
     def stop(self) -> None:
         self._stop.set()
+        w = self._watcher
+        if w is not None:
+            w.wake()
 
     def run(self) -> None:
         if not self._url:
             self._log.log("[Discord] Webhook URL が未設定のため停止します")
             return
-        if request is None:
-            self._log.log("[Discord] urllib が利用できないため停止します")
+        if http_client is None:
+            self._log.log("[Discord] http.client が利用できないため停止します")
+            return
+        try:
+            self._target = self._parse_url(self._url)
+        except Exception as e:
+            self._log.log(f"[Discord] Webhook URL が不正です: {e}")
             return
 
         self._log.log("[Discord] koutiku フォルダ監視を開始")
-        exts = {".png", ".jpg", ".jpeg", ".webp"}
+        # Files already present are skipped by time instead of being listed,
+        # which avoids a bulk-post on startup without walking the folder
+        self._start_ts = self._since = time.time()
+
+        watcher = DirWatcher(self._koutiku, _EXTS)
+        self._watcher = watcher
+        if self._stop.is_set():
+            watcher.close()
+            return
+        uploader = threading.Thread(target=self._upload_loop, name="discord-upload", daemon=True)
+        uploader.start()
+        pending: Set[str] = set()
+        rescan = False
         try:
-            # Initialize seen with current files to avoid bulk-post on startup
-            for name in os.listdir(self._koutiku):
-                path = os.path.join(self._koutiku, name)
-                if os.path.isfile(path) and os.path.splitext(name)[1].lower() in exts:
-                    self._seen.add(path)
-        except Exception:
-            pass
+            while not self._stop.is_set():
+                try:
+                    if rescan:
+                        pending.update(self._scan())
+                        rescan = False
+                    if pending:
+                        self._drain(pending, debounce=not watcher.closes_complete)
+                except Exception as e:
+                    self._log.log(f"[Discord] 監視ループエラー: {e}")
 
-        while not self._stop.is_set():
-            try:
-                # Prefer newest-first by mtime so fresh screenshots go out promptly
+                # Block until the OS reports a new file; only time out while
+                # there is something left to retry (or when polling)
+                changed = watcher.wait(2.0 if pending else None)
+                if self._stop.is_set():
+                    return
+                if changed is None:
+                    rescan = True
+                else:
+                    pending.update(p for p in changed if p not in self._seen)
+        finally:
+            self._watcher = None
+            watcher.close()
+            # Wake the uploader; an in-flight post is bounded by the HTTP timeout
+            self._queue.put(None)
+            uploader.join(timeout=1.0)
+            self._log.log("[Discord] 監視を停止")
+
+    def _scan(self) -> list[str]:
+        """Return image paths in koutiku changed after the rescan watermark."""
+        out = []
+        with self._seen_lock:
+            since = self._since
+        with os.scandir(self._koutiku) as it:
+            for e in it:
+                _stem, dot, ext = e.name.rpartition(".")
+                if not dot or ext.lower() not in _EXTS:
+                    continue
                 try:
-                    entries = []
-                    with os.scandir(self._koutiku) as it:
-                        for e in it:
-                            if not e.is_file():
-                                continue
-                            if os.path.splitext(e.name)[1].lower() not in exts:
-                                continue
-                            try:
-                                mt = e.stat().st_mtime
-                            except Exception:
-                                mt = 0.0
-                            entries.append((mt, e.name))
-                    names = [n for (_mt, n) in sorted(entries, key=lambda x: x[0], reverse=True)]
+                    # DirEntry caches the type (and on Windows the stat) from the listing
+                    if not e.is_file(follow_symlinks=False):
+                        continue
+                    st = e.stat(follow_symlinks=False)
                 except Exception:
-                    # Fallback to name sort if scandir/stat fails
-                    names = sorted(os.listdir(self._koutiku))
+                    continue
+                if max(st.st_mtime, st.st_ctime) > since:
+                    out.append(e.path)
+        with self._seen_lock:
+            return [p for p in out if p not in self._seen and p not in self._queued]
 
-                for name in names:
-                    if self._stop.is_set():
-                        return
-                    path = os.path.join(self._koutiku, name)
-                    if path in self._seen:
-                        continue
-                    if not os.path.isfile(path):
-                        continue
-                    if os.path.splitext(name)[1].lower() not in exts:
-                        continue
-                    # Basic debounce: ensure the file is fully written (size stable)
-                    try:
-                        size1 = os.path.getsize(path)
-                        time.sleep(0.1)
-                        size2 = os.path.getsize(path)
-                        if size1 != size2:
-                            # Try next tick
-                            continue
-                    except Exception:
-                        continue
+    def _mark_seen(self, path: str, ts: float) -> None:
+        """Record a posted file (caller holds _seen_lock)."""
+        seen = self._seen
+        seen[path] = ts
+        seen.move_to_end(path)
+        while len(seen) > _SEEN_MAX:
+            _old, old_ts = seen.popitem(last=False)
+            # Anything older than an evicted entry is no longer picked up by rescans
+            if old_ts > self._since:
+                self._since = old_ts
 
-                    # Attempt to post
-                    ok = self._post_file(path)
-                    if ok:
-                        self._seen.add(path)
-            except Exception as e:
-                self._log.log(f"[Discord] 監視ループエラー: {e}")
+    def _drain(self, pending: Set[str], debounce: bool) -> None:
+        """Queue pending files for upload once stable; files still growing stay pending."""
+        # One stat per file gives type, mtime (for ordering) and the first debounce size
+        stats = []
+        for path in list(pending):
+            try:
+                st = os.stat(path)
+            except Exception:
+                pending.discard(path)
+                continue
+            ts = max(st.st_mtime, st.st_ctime)
+            if ts <= self._start_ts or not stat.S_ISREG(st.st_mode):
+                pending.discard(path)
+                continue
+            stats.append((st.st_mtime, ts, st.st_size, path))
+        with self._seen_lock:
+            stats = [x for x in stats if x[3] not in self._seen and x[3] not in self._queued]
+        pending.intersection_update(x[3] for x in stats)
+        stats.sort(key=lambda x: x[0], reverse=True)
+        if not stats:
+            return
 
-            if self._stop.wait(2.0):
+        if debounce:
+            # Basic debounce: ensure files are fully written (size stable);
+            # one wait covers the whole batch
+            if self._stop.wait(0.1):
                 return
+            stable = []
+            for item in stats:
+                try:
+                    if os.stat(item[3]).st_size == item[2]:
+                        stable.append(item)
+                except Exception:
+                    pass
+                # Files still growing are tried next tick
+            stats = stable
+
+        with self._seen_lock:
+            self._queued.update(x[3] for x in stats)
+        for _mt, ts, size, path in stats:
+            pending.discard(path)
+            self._queue.put((ts, size, path))
+
+    def _upload_loop(self) -> None:
+        """Uploader thread: post queued files in batches, retrying failures."""
+        carry = None
+        try:
+            while not self._stop.is_set():
+                item = carry if carry is not None else self._queue.get()
+                carry = None
+                if item is None:
+                    return
+                # Take whatever else is already queued, within the attachment count/size limits
+                batch = [item]
+                nbytes = item[1]
+                while len(batch) < _BATCH_FILES:
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is None:
+                        self._queue.put(None)
+                        break
+                    if nbytes + nxt[1] > _BATCH_BYTES:
+                        carry = nxt
+                        break
+                    batch.append(nxt)
+                    nbytes += nxt[1]
+
+                delay = self._retry_at - time.monotonic()
+                if delay > 0 and self._stop.wait(delay):
+                    return
+                try:
+                    sent = set(self._post_files([path for (_ts, _size, path) in batch]))
+                except Exception as e:
+                    self._log.log(f"[Discord] 送信エラー: {e}")
+                    sent = set()
 
-        self._log.log("[Discord] 監視を停止")
+                failed = []
+                with self._seen_lock:
+                    for entry in batch:
+                        ts, _size, path = entry
+                        if path in sent:
+                            self._mark_seen(path, ts)
+                            self._queued.discard(path)
+                        elif os.path.isfile(path):
+                            failed.append(entry)
+                        else:
+                            self._queued.discard(path)
+                if failed:
+                    # Retry on the old 2s cadence (429 sets its own, longer pause)
+                    if self._stop.wait(2.0):
+                        return
+                    for entry in failed:
+                        self._queue.put(entry)
+        finally:
+            self._close_conn()
 
     # --- internals ---
-    def _post_file(self, path: str) -> bool:
-        name = os.path.basename(path)
-        content_text = f"新しいスクリーンショット: {name}"
+    @staticmethod
+    def _parse_url(url: str):
+        """Split the webhook URL into (scheme, host, port, path?query&wait=true)."""
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(url)
+        # Discord returns the created message (2xx body) only with wait=true
+        query = parts.query
+        if "wait=" not in query:
+            query = f"{query}&wait=true" if query else "wait=true"
+        path = f"{parts.path or '/'}?{query}"
+        return parts.scheme, parts.hostname, parts.port, path
+
+    def _get_conn(self):
+        if self._conn is None:
+            scheme, host, port, _path = self._target
+            cls = http_client.HTTPSConnection if scheme == "https" else http_client.HTTPConnection
+            self._conn = cls(host, port, timeout=15)
+            self._conn_used = False
+        return self._conn
+
+    def _close_conn(self) -> None:
+        conn = self._conn
+        self._conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def _request(self, make_body, headers: dict):
+        """POST over the kept-alive connection; returns (status, reason, body, headers).
+
+        `make_body` returns a fresh iterable of body chunks per attempt; headers
+        must carry Content-Length so http.client streams it without chunking.
+
+        A connection that was already used may have been closed by the server
+        while idle, so a failure on it is retried once on a fresh connection.
+        """
+        for _attempt in range(2):
+            conn = self._get_conn()
+            reused = self._conn_used
+            try:
+                conn.request("POST", self._target[3], body=make_body(), headers=headers)
+                resp = conn.getresponse()
+                # Drain the body so the connection can carry the next request
+                data = resp.read()
+                self._conn_used = True
+                if resp.will_close:
+                    self._close_conn()
+                return resp.status, resp.reason, data, resp.headers
+            except (http_client.HTTPException, OSError):
+                self._close_conn()
+                if not reused:
+                    raise
+        raise ConnectionError("retry failed")
+
+    def _post_files(self, paths: list[str]) -> list[str]:
+        """Post up to 10 files as one message; returns the paths Discord accepted."""
+        names = [os.path.basename(p) for p in paths]
+        if len(names) == 1:
+            content_text = f"新しいスクリーンショット: {names[0]}"
+        else:
+            content_text = f"新しいスクリーンショット ({len(names)}件): " + ", ".join(names)
         try:
-            body, ctype = self._build_multipart_request(path, content_text)
+            segments, tail, ctype, length = self._build_multipart_request(paths, content_text)
         except Exception as e:
             self._log.log(f"[Discord] 送信準備に失敗: {e}")
-            return False
+            return []
 
         try:
-            # Discord may reject requests without a UA; also prefer wait=true for 2xx body
-            url = self._url
-            if "?" in url:
-                if "wait=" not in url:
-                    url = url + "&wait=true"
-            else:
-                url = url + "?wait=true"
-            req = request.Request(url, data=body)
-            req.add_header("Content-Type", ctype)
-            req.add_header("User-Agent", "obs-screenshot-tool")
-            req.add_header("Accept", "application/json")
-            with request.urlopen(req, timeout=15) as resp:
-                code = getattr(resp, "status", None) or getattr(resp, "code", 0)
-                if 200 <= int(code) < 300:
-                    self._log.log(f"[Discord] 送信しました: {name}")
-                    return True
-                else:
-                    self._log.log(f"[Discord] 送信失敗 (HTTP {code}): {name}")
-                    return False
-        except Exception as e:  # includes HTTPError/URLError
-            # Try to extract HTTP status/body for diagnostics
+            # Discord may reject requests without a UA
+            headers = {
+                "Content-Type": ctype,
+                "User-Agent": "obs-screenshot-tool",
+                "Accept": "application/json",
+                "Content-Length": str(length),
+            }
+            code, reason, data, resp_headers = self._request(
+                lambda: self._iter_body(segments, tail), headers
+            )
+        except Exception as e:
+            self._log.log(f"[Discord] 送信エラー: {e}")
+            return []
+        body = None
+        try:
+            if data:
+                body = json.loads(data.decode("utf-8", errors="ignore"))
+        except Exception:
+            body = None
+
+        if 200 <= int(code) < 300:
+            sent = self._accepted(paths, body)
+            self._log.log(f"[Discord] 送信しました: {', '.join(os.path.basename(p) for p in sent)}")
+            return sent
+        if int(code) == 429:
+            # Rate limited: pause posting; files stay pending and are retried
+            wait = None
             try:
-                if isinstance(e, error.HTTPError):  # type: ignore[attr-defined]
-                    code = getattr(e, "code", None)
-                    reason = getattr(e, "reason", "")
-                    detail = ""
-                    try:
-                        data = e.read()
-                        if data:
-                            detail = data.decode("utf-8", errors="ignore")[:300]
-                    except Exception:
-                        pass
-                    self._log.log(f"[Discord] 送信エラー (HTTP {code} {reason}): {detail}")
-                    return False
+                wait = float((body or {}).get("retry_after"))
             except Exception:
                 pass
-            self._log.log(f"[Discord] 送信エラー: {e}")
-            return False
+            if wait is None:
+                try:
+                    wait = float(resp_headers.get("Retry-After") or 1.0)
+                except Exception:
+                    wait = 1.0
+            self._retry_at = time.monotonic() + min(max(wait, 0.0), 60.0)
+            self._log.log(f"[Discord] レート制限のため {wait:.1f} 秒待機します")
+            return []
+        if int(code) == 413 and len(paths) > 1:
+            # Too large as one message: fall back to one file per post
+            sent = []
+            for p in paths:
+                if self._stop.is_set():
+                    break
+                sent.extend(self._post_files([p]))
+            return sent
+        # Include HTTP status/body for diagnostics
+        detail = ""
+        try:
+            if data:
+                detail = data.decode("utf-8", errors="ignore")[:300]
+        except Exception:
+            pass
+        self._log.log(f"[Discord] 送信エラー (HTTP {code} {reason}): {detail}")
+        return []
 
-    def _build_multipart_request(self, file_path: str, content: str):
-        # Compose a multipart/form-data body compatible with Discord webhook execute
-        boundary = f"---------------------------{int(time.time()*1000)}"
-        lf = "\r\n".encode("utf-8")
+    @staticmethod
+    def _accepted(paths: list[str], body) -> list[str]:
+        """Paths confirmed by the attachments of the created message.
 
-        parts: list[bytes] = []
+        Without a parseable reply (or when every file came back) all paths
+        count as sent; otherwise only filenames Discord echoed are.
+        """
+        try:
+            attachments = body.get("attachments") if isinstance(body, dict) else None
+        except Exception:
+            attachments = None
+        if not isinstance(attachments, list) or len(attachments) >= len(paths):
+            return list(paths)
+        got = {str(a.get("filename", "")) for a in attachments if isinstance(a, dict)}
+        return [p for p in paths if os.path.basename(p) in got]
+
+    def _build_multipart_request(self, file_paths: list[str], content: str):
+        """Compose a multipart/form-data body compatible with Discord webhook execute.
 
+        Returns (segments, tail, content_type, content_length) where segments is
+        a list of (header_bytes, file_path, file_size); only the small headers
+        are built in memory, files are streamed by `_iter_body`.
+        """
         # Part 1: payload_json
-        payload = {"content": content}
-        payload_bytes = json.dumps(payload, ensure_ascii=False).encode("utf-8")
-        parts.append((
-            f"--{boundary}\r\n"
-            "Content-Disposition: form-data; name=\"payload_json\"\r\n"
-            "Content-Type: application/json; charset=utf-8\r\n\r\n"
-        ).encode("utf-8") + payload_bytes + lf)
-
-        # Part 2: file (Discord accepts files[0])
-        filename = os.path.basename(file_path)
-        mime, _ = mimetypes.guess_type(filename)
-        if not mime:
-            mime = "application/octet-stream"
-        with open(file_path, "rb") as f:
-            file_bytes = f.read()
-        header = (
-            f"--{boundary}\r\n"
-            f"Content-Disposition: form-data; name=\"files[0]\"; filename=\"{filename}\"\r\n"
-            f"Content-Type: {mime}\r\n\r\n"
-        ).encode("utf-8")
-        parts.append(header + file_bytes + lf)
-
-        # End boundary
-        parts.append((f"--{boundary}--\r\n").encode("utf-8"))
-
-        body = b"".join(parts)
-        content_type = f"multipart/form-data; boundary={boundary}"
-        return body, content_type
+        payload_bytes = json.dumps({"content": content}, ensure_ascii=False).encode("utf-8")
+        lead = self._payload_head + payload_bytes
+
+        # Parts 2..: files[0]..files[n-1]
+        segments = []
+        length = len(self._part_end)
+        for i, file_path in enumerate(file_paths):
+            filename = os.path.basename(file_path)
+            mime, _ = mimetypes.guess_type(filename)
+            if not mime:
+                mime = "application/octet-stream"
+            size = os.path.getsize(file_path)
+            head = b"".join((
+                lead, b"\r\n",
+                self._file_heads[i], filename.encode("utf-8"),
+                b"\"\r\nContent-Type: ", mime.encode("ascii"), b"\r\n\r\n",
+            ))
+            # Every later part starts by terminating the previous file
+            lead = b""
+            segments.append((head, file_path, size))
+            length += len(head) + size
+        return segments, self._part_end, self._content_type, length
 
+    @staticmethod
+    def _iter_body(segments, tail: bytes):
+        """Yield the multipart body in 64 KiB pieces, reading exactly `size` bytes per file."""
+        for head, file_path, size in segments:
+            yield head
+            with open(file_path, "rb") as f:
+                left = size
+                while left > 0:
+                    chunk = f.read(min(_SEND_CHUNK, left))
+                    if not chunk:
+                        raise IOError(f"file shrank while sending: {file_path}")
+                    left -= len(chunk)
+                    yield chunk
+        yield tail
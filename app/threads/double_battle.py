@@ -4,13 +4,23 @@ import datetime
 import os
 import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
 
 from app.obs_client import ObsClient
-from app.utils.image import crop_by_coords_list, crop_image_by_rect, match_template
+from app.utils.image import (
+    coords_to_slices,
+    crop_image_by_rect,
+    dhash,
+    hamming64,
+    match_template_pyramid,
+    pyramid_down,
+    to_gray,
+    write_image,
+)
 from app.utils import paths as paths_utils
 from app.utils.logging import UiLogger
 
@@ -23,6 +33,10 @@ except Exception:
     _NativeDouble = None  # type: ignore
 
 
+# Seconds the file route is used after an in-memory screenshot failed
+_MEM_RETRY_SEC = 30.0
+
+
 class PyDoubleBattleThread(threading.Thread):
     """Detect a specific board state by template matching and prepare output images.
 
@@ -65,10 +79,36 @@ class PyDoubleBattleThread(threading.Thread):
 
         self._ref_files = [f"banme{i}.jpg" for i in range(1, 5)]
         self._ref_paths = [os.path.join(self._handan, f) for f in self._ref_files]
+        # Decoded templates (grayscale + half size), reloaded only when files change
+        self._tpl_mtimes: Optional[tuple] = None
+        self._masu_gray = None
+        self._masu_half = None
+        self._masu_dhash: Optional[int] = None
+        self._tag_grays: Optional[list] = None
+        self._tag_halves: Optional[list] = None
+        self._load_templates()
+        # Grab screenshots in memory; after a failure the file route is used
+        # until this monotonic time, then memory is tried again
+        self._mem_retry_at = 0.0
+        # Frames up to this old (s) captured by another thread are reused
+        try:
+            self._frame_max_age = float((os.getenv("SHARED_FRAME_MAX_AGE", "0.05") or 0.05))
+        except Exception:
+            self._frame_max_age = 0.05
 
         # Coords (x, y)
         self._masu_rect = ((1541, 229), (1651, 843))
         self._screenshot_rect = ((1221, 150), (1655, 850))
+        # Six team rows (x1, y1, x2, y2) searched for the banme tags, as slices
+        tag_coords: Sequence[Tuple[int, int, int, int]] = (
+            (146, 138, 933, 255),
+            (146, 255, 933, 372),
+            (146, 372, 933, 489),
+            (146, 489, 933, 606),
+            (146, 606, 933, 723),
+            (146, 723, 933, 840),
+        )
+        self._tag_slices = coords_to_slices(tag_coords)
 
         # Thresholds (overridable via env)
         try:
@@ -81,6 +121,19 @@ class PyDoubleBattleThread(threading.Thread):
             self._th_tag = float((_os.getenv("DOUBLE_TAG_THRESHOLD", "0.4") or 0.4))
         except Exception:
             self._th_tag = 0.4
+        # dHash prefilter for the masu check: Hamming distances above this skip the
+        # correlation (64 disables). Only used when masu.png spans most of the area.
+        try:
+            self._masu_dhash_max = int((os.getenv("DOUBLE_MASU_DHASH_MAX", "20") or 20))
+        except Exception:
+            self._masu_dhash_max = 20
+        # Intermediate crops (masu_area.png etc.) are only written for debugging
+        self._debug = (os.getenv("DOUBLE_BATTLE_DEBUG", "0") or "0").strip().lower() not in ("0", "false", "no")
+        # Tag searches run in parallel (OpenCV releases the GIL); created in run()
+        self._match_pool: Optional[ThreadPoolExecutor] = None
+        # No-rest mode: the next screenshot is fetched while this one is matched
+        self._grab_pool: Optional[ThreadPoolExecutor] = None
+        self._grab_fut: Optional[Future] = None
 
     # --- public ---
     def stop(self):
@@ -89,6 +142,11 @@ class PyDoubleBattleThread(threading.Thread):
     # --- threading.Thread ---
     def run(self) -> None:
         self._log.log("[ダブルバトル] スレッド開始")
+        workers = min(len(self._ref_paths), os.cpu_count() or 1)
+        if workers > 1:
+            self._match_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="double-match")
+        if self._interval <= 0:
+            self._grab_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="double-grab")
         try:
             while not self._stop.is_set():
                 self._iteration()
@@ -98,96 +156,214 @@ class PyDoubleBattleThread(threading.Thread):
         except Exception as e:
             self._log.log(f"[ダブルバトル] エラー: {e}")
         finally:
+            for attr in ("_match_pool", "_grab_pool"):
+                pool = getattr(self, attr)
+                setattr(self, attr, None)
+                if pool is not None:
+                    pool.shutdown(wait=False)
+            self._grab_fut = None
             self._log.log("[ダブルバトル] スレッド停止")
 
     # --- internals ---
+    def _find_tag(self, tag, tag_half, grays, halves) -> Optional[int]:
+        """Index of the first crop containing `tag`, or None."""
+        for i, (c_gray, c_half) in enumerate(zip(grays, halves)):
+            if match_template_pyramid(c_gray, tag, self._th_tag, image_half=c_half, template_half=tag_half):
+                return i
+        return None
+
+    def _load_templates(self) -> None:
+        """Decode masu/banme templates once; re-read only if a file's mtime changes."""
+        paths = [self._masu_path, *self._ref_paths]
+        mtimes = []
+        for p in paths:
+            try:
+                mtimes.append(os.stat(p).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        key = tuple(mtimes)
+        if key == self._tpl_mtimes:
+            return
+        self._tpl_mtimes = key
+
+        masu_img = cv2.imread(self._masu_path)
+        if masu_img is None:
+            self._masu_gray = self._masu_half = None
+            self._masu_dhash = None
+        else:
+            self._masu_gray = to_gray(masu_img)
+            self._masu_half = pyramid_down(self._masu_gray)
+            self._masu_dhash = dhash(self._masu_gray)
+
+        tag_images = [cv2.imread(p) for p in self._ref_paths]
+        if any(t is None for t in tag_images):
+            self._tag_grays = self._tag_halves = None
+        else:
+            self._tag_grays = [to_gray(t) for t in tag_images]
+            self._tag_halves = [pyramid_down(t) for t in self._tag_grays]
+
+    def _grab_scene(self):
+        """Return the current scene as a BGR array.
+
+        Decodes the screenshot straight from the WebSocket reply, so no PNG is
+        written to and re-read from handantmp (scene.png is still written when
+        DOUBLE_BATTLE_DEBUG is on). Falls back to the file route for a while
+        when OBS does not return image data.
+        """
+        if time.monotonic() >= self._mem_retry_at:
+            try:
+                # Shared with other detector threads polling the same source
+                img = self._obs.get_latest_frame(self._source, self._frame_max_age, None)
+            except Exception as e:
+                # Often transient (timeout, reconnect): retry memory after a cooldown
+                self._mem_retry_at = time.monotonic() + _MEM_RETRY_SEC
+                self._log.log(f"[ダブルバトル] メモリ取得に失敗したため {_MEM_RETRY_SEC:.0f} 秒間ファイル経由に切替: {e}")
+            else:
+                if img is not None and self._debug:
+                    cv2.imwrite(self._scene_path, img)
+                return img
+        self._obs.take_screenshot(self._source, self._scene_path)
+        return cv2.imread(self._scene_path)
+
+    def _next_scene(self):
+        """Scene for this iteration; in no-rest mode also start fetching the next one.
+
+        The OBS round trip for frame N+1 then overlaps the matching of frame N,
+        so an iteration costs max(fetch, match) instead of their sum.
+        """
+        pool = self._grab_pool
+        if pool is None:
+            return self._grab_scene()
+        fut, self._grab_fut = self._grab_fut, None
+        try:
+            img = fut.result() if fut is not None else self._grab_scene()
+        finally:
+            if not self._stop.is_set():
+                self._grab_fut = pool.submit(self._grab_scene)
+        return img
+
     def _iteration(self) -> None:
         # 1) Ensure we have a scene screenshot
+        scene_img = None
         for _ in range(10):
             if self._stop.is_set():
                 return
             try:
-                self._obs.take_screenshot(self._source, self._scene_path)
+                scene_img = self._next_scene()
             except Exception as e:
                 self._log.log(f"[ダブルバトル] スクリーンショット取得に失敗: {e}")
-            if os.path.exists(self._scene_path):
+            if scene_img is not None:
                 break
-            time.sleep(0.5)
+            if self._stop.wait(0.5):
+                return
 
-        # 2) Crop the main region and write temp
-        scene_img = cv2.imread(self._scene_path)
+        # 2) Crop the main region (temp copy only when debugging)
         if scene_img is None:
             return
         crop = crop_image_by_rect(scene_img, self._screenshot_rect)
-        cropped_path = os.path.join(self._handan, "screenshot_cropped.png")
-        cv2.imwrite(cropped_path, crop)
-        self._log.log("[ダブルバトル] screenshot_cropped.png を出力")
+        if self._debug:
+            cropped_path = os.path.join(self._handan, "screenshot_cropped.png")
+            cv2.imwrite(cropped_path, crop)
+            self._log.log("[ダブルバトル] screenshot_cropped.png を出力")
 
         # 3) Detect presence of 'masu' template in its area
-        masu_img = cv2.imread(self._masu_path)
-        if masu_img is None:
+        self._load_templates()
+        masu_gray, masu_half = self._masu_gray, self._masu_half
+        if masu_gray is None:
             raise FileNotFoundError(f"masu.png not found: {self._masu_path}")
-        masu_area = crop_image_by_rect(cv2.imread(self._scene_path), self._masu_rect)
+        # Match on grayscale with a half-resolution coarse pass
+        masu_area = crop_image_by_rect(scene_img, self._masu_rect)
         masu_area_path = os.path.join(self._handan, "masu_area.png")
-        cv2.imwrite(masu_area_path, masu_area)
-
-        if match_template(masu_area, masu_img, threshold=self._th_masu, grayscale=False):
+        if self._debug:
+            cv2.imwrite(masu_area_path, masu_area)
+
+        masu_dhash = self._masu_dhash
+        (mx1, my1), (mx2, my2) = self._masu_rect
+        mh, mw = masu_gray.shape[:2]
+        # A whole-image hash only says something when the template is close to area size
+        use_dhash = (
+            masu_dhash is not None
+            and self._masu_dhash_max < 64
+            and mh * 2 >= (my2 - my1)
+            and mw * 2 >= (mx2 - mx1)
+        )
+
+        def _masu_found(area) -> bool:
+            area_gray = to_gray(area)
+            if use_dhash and hamming64(dhash(area_gray), masu_dhash) > self._masu_dhash_max:
+                # Clearly a different screen: skip the cross-correlation
+                return False
+            return match_template_pyramid(area_gray, masu_gray, self._th_masu, template_half=masu_half)
+
+        if _masu_found(masu_area):
             self._log.log("[ダブルバトル] 'masu' テンプレートを検出")
+            # The prefetched frame would be stale once the loop below ends
+            self._grab_fut = None
 
             # Keep recent crop for broadcasting
-            cv2.imwrite(self._haisinyou_path, crop)
+            write_image(self._haisinyou_path, crop)
 
             # Save timestamped copy (match OBS naming: CCYY-MM-DD_hh-mm-ss)
             ts = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
             ext = paths_utils.get_output_format_ext()
             dst = os.path.join(self._koutiku, f"{ts}.{ext}")
-            cv2.imwrite(dst, crop)
+            write_image(dst, crop)
             self._log.log(f"[ダブルバトル] 保存しました: {dst}")
 
             # While masu continues to appear, attempt to match reference tiles
-            while match_template(masu_area, masu_img, threshold=self._th_masu, grayscale=False):
+            while _masu_found(masu_area):
                 if self._stop.is_set():
                     return
-                self._obs.take_screenshot(self._source, self._scene_path)
-                scene = cv2.imread(self._scene_path)
+                scene = self._grab_scene()
+                if scene is None:
+                    if self._stop.wait(1):
+                        return
+                    continue
                 masu_area = crop_image_by_rect(scene, self._masu_rect)
-                cv2.imwrite(masu_area_path, masu_area)
+                if self._debug:
+                    cv2.imwrite(masu_area_path, masu_area)
 
-                tag_images = [cv2.imread(p) for p in self._ref_paths]
-                if any(t is None for t in tag_images):
+                self._load_templates()
+                tag_grays, tag_halves = self._tag_grays, self._tag_halves
+                if tag_grays is None or tag_halves is None:
                     self._log.log("[ダブルバトル] 参照画像が見つからないためスキップ")
-                    time.sleep(1)
+                    if self._stop.wait(1):
+                        return
                     continue
 
-                coords: Sequence[Tuple[int, int, int, int]] = (
-                    (146, 138, 933, 255),
-                    (146, 255, 933, 372),
-                    (146, 372, 933, 489),
-                    (146, 489, 933, 606),
-                    (146, 606, 933, 723),
-                    (146, 723, 933, 840),
-                )
-                cropped_new = crop_by_coords_list(scene, coords)
+                # Views into the scene; only the gray/half copies below allocate
+                cropped_new = [scene[sl] for sl in self._tag_slices]
+                # Convert/downscale each crop once; every tag is matched against them
+                cropped_gray = [to_gray(c) for c in cropped_new]
+                cropped_half = [pyramid_down(c) for c in cropped_gray]
+
+                # The 4 tag searches are independent; fan them out when a pool exists
+                pool = self._match_pool
+                if pool is not None:
+                    futs = [
+                        pool.submit(self._find_tag, t, th, cropped_gray, cropped_half)
+                        for t, th in zip(tag_grays, tag_halves)
+                    ]
+                    hits = [f.result() for f in futs]
+                else:
+                    hits = []
+                    for t, th in zip(tag_grays, tag_halves):
+                        hits.append(self._find_tag(t, th, cropped_gray, cropped_half))
+                        if hits[-1] is None:
+                            break
 
                 matched_new: list[np.ndarray] = []
                 all_ok = True
-                for idx, tag in enumerate(tag_images):
-                    found = False
-                    for c in cropped_new:
-                        if c.shape[0] >= tag.shape[0] and c.shape[1] >= tag.shape[1]:
-                            res = cv2.matchTemplate(c, tag, cv2.TM_CCOEFF_NORMED)
-                            if np.any(res >= self._th_tag):
-                                matched_new.append(c)
-                                found = True
-                                break
-                    if not found:
+                for idx, hit in enumerate(hits):
+                    if hit is None:
                         self._log.log(f"[ダブルバトル] タグ{idx + 1} が見つかりません")
                         all_ok = False
                         break
+                    matched_new.append(cropped_new[hit])
 
                 if all_ok and len(matched_new) == 4:
                     combined = cv2.vconcat(matched_new)
-                    cv2.imwrite(self._haisinsensyutu_path, combined)
+                    write_image(self._haisinsensyutu_path, combined)
                     self._log.log(f"[ダブルバトル] 抽出画像を書き出し: {self._haisinsensyutu_path}")
                 # Stay responsive to stop while looping
                 if self._stop.wait(1):
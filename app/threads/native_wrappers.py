@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import os
+import queue
 import sys
 import ctypes
 import threading
@@ -13,14 +14,72 @@ from app.utils.logging import UiLogger
 from app.utils import paths as paths_utils
 from app.utils import pairs as pairs_utils
 
+# Callback signatures
+_CB_SHOT = ctypes.WINFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_wchar_p, ctypes.c_wchar_p)
+_CB_START = ctypes.WINFUNCTYPE(ctypes.c_int, ctypes.c_void_p)
+_CB_STOP = ctypes.WINFUNCTYPE(ctypes.c_int, ctypes.c_void_p)
+_CB_ISREC = ctypes.WINFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(ctypes.c_int))
+_CB_EVENT = ctypes.WINFUNCTYPE(None, ctypes.c_void_p, ctypes.c_int, ctypes.c_double)
+_CB_LOG = ctypes.WINFUNCTYPE(None, ctypes.c_void_p, ctypes.c_wchar_p)
+
+
 _dll = None
 _available = False
+# Set after the first load attempt, successful or not, so a missing DLL is
+# not searched for again on every is_available() / constructor call
+_loaded = False
+_load_lock = threading.Lock()
 
 
 def _load_dll() -> None:
-    global _dll, _available
-    if _dll is not None:
+    global _loaded
+    if _loaded:
         return
+    with _load_lock:
+        if _loaded:
+            return
+        try:
+            _load_dll_once()
+        finally:
+            _loaded = True
+
+
+_DLL_NAME = "automation.dll"
+_LOAD_WITH_ALTERED_SEARCH_PATH = 0x00000008
+_MAX_PATH = 32767
+
+
+def _load_with_deps(dirs: list[Path]):
+    """Find automation.dll with one SearchPathW over the candidate dirs and load it
+    with LOAD_WITH_ALTERED_SEARCH_PATH, so DLLs next to it (e.g. OpenCV in
+    native/build) resolve even under Python's restricted default DLL search.
+    Returns None when not found or on any failure.
+    """
+    try:
+        from ctypes import wintypes
+
+        k32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        k32.SearchPathW.restype = wintypes.DWORD
+        k32.SearchPathW.argtypes = [
+            wintypes.LPCWSTR, wintypes.LPCWSTR, wintypes.LPCWSTR,
+            wintypes.DWORD, wintypes.LPWSTR, ctypes.c_void_p,
+        ]
+        k32.LoadLibraryExW.restype = wintypes.HMODULE
+        k32.LoadLibraryExW.argtypes = [wintypes.LPCWSTR, wintypes.HANDLE, wintypes.DWORD]
+        buf = ctypes.create_unicode_buffer(_MAX_PATH)
+        n = k32.SearchPathW(";".join(str(d) for d in dirs), _DLL_NAME, None, _MAX_PATH, buf, None)
+        if not n or n >= _MAX_PATH:
+            return None
+        handle = k32.LoadLibraryExW(buf.value, None, _LOAD_WITH_ALTERED_SEARCH_PATH)
+        if not handle:
+            return None
+        return ctypes.WinDLL(buf.value, handle=handle)
+    except Exception:
+        return None
+
+
+def _load_dll_once() -> None:
+    global _dll, _available
     roots: list[Path] = []
     try:
         meipass = getattr(sys, "_MEIPASS", None)
@@ -37,18 +96,21 @@ def _load_dll() -> None:
         roots.append(Path(__file__).resolve().parents[2])
     except Exception:
         roots.append(Path.cwd())
-    # Candidates
-    cands: list[Path] = []
+    # Candidate directories, in priority order
+    dirs: list[Path] = []
     for r in roots:
-        cands.append(r / "native" / "build" / "automation.dll")
-        cands.append(r / "native" / "automation.dll")
-    for p in cands:
-        try:
-            if p.exists():
-                _dll = ctypes.WinDLL(str(p))
-                break
-        except Exception:
-            _dll = None
+        dirs.append(r / "native" / "build")
+        dirs.append(r / "native")
+    _dll = _load_with_deps(dirs)
+    if _dll is None:
+        for d in dirs:
+            p = d / _DLL_NAME
+            try:
+                if p.exists():
+                    _dll = ctypes.WinDLL(str(p))
+                    break
+            except Exception:
+                _dll = None
     _available = _dll is not None
     if not _available:
         return
@@ -67,8 +129,8 @@ def _load_dll() -> None:
         ctypes.c_wchar_p,
         ctypes.c_wchar_p,
         ctypes.c_double,
-        ctypes.c_void_p,
-        ctypes.c_void_p,
+        _CB_SHOT,
+        _CB_LOG,
         ctypes.c_void_p,
     ]
     _dll.start_double_battle_w.restype = ctypes.c_void_p
@@ -82,12 +144,12 @@ def _load_dll() -> None:
         ctypes.c_wchar_p,
         ctypes.c_wchar_p,
         ctypes.c_double,
-        ctypes.c_void_p,
-        ctypes.c_void_p,
-        ctypes.c_void_p,
-        ctypes.c_void_p,
-        ctypes.c_void_p,
-        ctypes.c_void_p,
+        _CB_SHOT,
+        _CB_START,
+        _CB_STOP,
+        _CB_ISREC,
+        _CB_EVENT,
+        _CB_LOG,
         ctypes.c_void_p,
     ]
     _dll.start_rkaisi_teisi_w.restype = ctypes.c_void_p
@@ -104,13 +166,66 @@ def is_available() -> bool:
     return bool(_available)
 
 
-# Callback signatures
-_CB_SHOT = ctypes.WINFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.c_wchar_p, ctypes.c_wchar_p)
-_CB_START = ctypes.WINFUNCTYPE(ctypes.c_int, ctypes.c_void_p)
-_CB_STOP = ctypes.WINFUNCTYPE(ctypes.c_int, ctypes.c_void_p)
-_CB_ISREC = ctypes.WINFUNCTYPE(ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(ctypes.c_int))
-_CB_EVENT = ctypes.WINFUNCTYPE(None, ctypes.c_void_p, ctypes.c_int, ctypes.c_double)
-_CB_LOG = ctypes.WINFUNCTYPE(None, ctypes.c_void_p, ctypes.c_wchar_p)
+# Threads registered as callback targets, keyed by the ctx value handed to the DLL.
+# Holding them here keeps a strong reference while native code may still call back.
+_instances: dict[int, object] = {}
+_instances_lock = threading.Lock()
+
+
+def _register(obj) -> int:
+    key = id(obj)
+    with _instances_lock:
+        _instances[key] = obj
+    return key
+
+
+def _unregister(key: Optional[int]) -> None:
+    if key is None:
+        return
+    with _instances_lock:
+        _instances.pop(key, None)
+
+
+# Module-level trampolines: created once, shared by every thread instance.
+@_CB_SHOT
+def _tramp_shot(ctx, src, out_path):
+    obj = _instances.get(ctx)
+    return obj._on_shot(src, out_path) if obj is not None else -1
+
+
+@_CB_START
+def _tramp_start(ctx):
+    obj = _instances.get(ctx)
+    return obj._on_start() if obj is not None else -1
+
+
+@_CB_STOP
+def _tramp_stop(ctx):
+    obj = _instances.get(ctx)
+    return obj._on_stop() if obj is not None else -1
+
+
+@_CB_ISREC
+def _tramp_isrec(ctx, out_state_ptr):
+    obj = _instances.get(ctx)
+    if obj is None:
+        out_state_ptr[0] = -1
+        return -1
+    return obj._on_isrec(out_state_ptr)
+
+
+@_CB_EVENT
+def _tramp_event(ctx, ev, ts):
+    obj = _instances.get(ctx)
+    if obj is not None:
+        obj._on_event(ev, ts)
+
+
+@_CB_LOG
+def _tramp_log(ctx, msg):
+    obj = _instances.get(ctx)
+    if obj is not None:
+        obj._on_log(msg)
 
 
 class DoubleBattleNativeThread(threading.Thread):
@@ -120,6 +235,8 @@ class DoubleBattleNativeThread(threading.Thread):
         if not _available:
             raise RuntimeError("native automation.dll not available")
         self._obs = obs
+        # Bound once so the per-frame callback skips the attribute lookups
+        self._take_screenshot = obs.take_screenshot
         self._base_dir = base_dir
         self._log = logger or UiLogger()
         self._source = source_name
@@ -127,8 +244,12 @@ class DoubleBattleNativeThread(threading.Thread):
             self._interval = float(capture_interval_sec or 0)
         except Exception:
             self._interval = 0.0
-        self._stop = threading.Event()
+        # Plain flag for "should we exit"; the Event only parks run() until stop()
+        self._stopping = False
+        self._wake = threading.Event()
         self._handle: Optional[int] = None
+        self._handle_cvp: Optional[ctypes.c_void_p] = None
+        self._handle_lock = threading.Lock()
         # Paths prepared same as Python implementation
         self._haisin_dir = paths_utils.get_haisin_dir(base_dir)
         self._koutiku_dir = paths_utils.get_koutiku_dir(base_dir)
@@ -136,50 +257,77 @@ class DoubleBattleNativeThread(threading.Thread):
         os.makedirs(self._koutiku_dir, exist_ok=True)
         self._haisinyou_path = paths_utils.get_broadcast_output_path(base_dir)
         self._out_ext = paths_utils.get_output_format_ext()
+        self._ctx: Optional[int] = None
+        # Wide-string arguments encoded once; c_wchar_p argtypes accept the buffers
+        self._base_dir_buf = ctypes.create_unicode_buffer(self._base_dir)
+        self._source_buf = ctypes.create_unicode_buffer(self._source)
+        self._haisinyou_buf = ctypes.create_unicode_buffer(self._haisinyou_path)
+        self._koutiku_buf = ctypes.create_unicode_buffer(self._koutiku_dir)
+        self._out_ext_buf = ctypes.create_unicode_buffer(self._out_ext)
 
-        # Bind callbacks and keep references to avoid GC
-        def _cb_shot(_ctx, src, out_path):
-            try:
-                self._obs.take_screenshot(src, out_path)
-                return 0
-            except Exception:
-                return -1
-        def _cb_log(_ctx, msg):
+    # --- callbacks (dispatched from the module-level trampolines) ---
+    def _on_shot(self, src, out_path) -> int:
+        try:
+            self._take_screenshot(src, out_path)
+            return 0
+        except Exception:
+            return -1
+
+    def _on_log(self, msg) -> None:
+        # No try: UiLogger.log does not raise, and anything unexpected is
+        # reported by ctypes through sys.unraisablehook
+        self._log.log(msg)
+
+    def stop(self) -> None:
+        # Flag first: run() publishes the handle and then checks _stopping, so
+        # either it sees the flag and stops the handle itself, or the handle is
+        # already published for _stop_native() below. Then release run().
+        # The ctx stays registered: stop_*() does not join the detached native
+        # worker, which may still call back (run() unregisters on exit).
+        self._stopping = True
+        self._stop_native()
+        self._wake.set()
+
+    def _stop_native(self) -> None:
+        # Take the handle exactly once so stop() and run() never both stop it
+        with self._handle_lock:
+            cvp, self._handle_cvp = self._handle_cvp, None
+        if cvp is not None:
             try:
-                self._log.log(msg)
+                _dll.stop_double_battle(cvp)
             except Exception:
                 pass
-        self._cb_shot = _CB_SHOT(_cb_shot)
-        self._cb_log = _CB_LOG(_cb_log)
-
-    def stop(self) -> None:
-        self._stop.set()
-        try:
-            if self._handle:
-                _dll.stop_double_battle(ctypes.c_void_p(self._handle))
-        except Exception:
-            pass
 
     def run(self) -> None:
         self._log.log("[ダブルバトル/N] ネイティブ実装を開始")
+        self._ctx = _register(self)
         try:
+            # argtypes do the marshalling; callbacks are passed as typed pointers
             self._handle = _dll.start_double_battle_w(
-                ctypes.c_wchar_p(self._base_dir),
-                ctypes.c_wchar_p(self._source),
-                ctypes.c_wchar_p(self._haisinyou_path),
-                ctypes.c_wchar_p(self._koutiku_dir),
-                ctypes.c_wchar_p(self._out_ext),
-                ctypes.c_double(self._interval),
-                ctypes.cast(self._cb_shot, ctypes.c_void_p),
-                ctypes.cast(self._cb_log, ctypes.c_void_p),
-                None,
+                self._base_dir_buf,
+                self._source_buf,
+                self._haisinyou_buf,
+                self._koutiku_buf,
+                self._out_ext_buf,
+                self._interval,
+                _tramp_shot,
+                _tramp_log,
+                self._ctx,
             )
-            # Wait until stopped
-            while not self._stop.wait(0.2):
-                pass
+            if self._handle:
+                with self._handle_lock:
+                    self._handle_cvp = ctypes.c_void_p(self._handle)
+            # stop() may have run before the handle existed
+            if self._stopping:
+                self._stop_native()
+            # Block until stop(); the DLL does the work on its own threads
+            while not self._stopping:
+                self._wake.wait()
         except Exception as e:
             self._log.log(f"[ダブルバトル/N] エラー: {e}")
         finally:
+            # Either start failed or the native side has been stopped by now
+            _unregister(self._ctx)
             self._log.log("[ダブルバトル/N] 停止")
 
 
@@ -190,111 +338,166 @@ class RkaisiTeisiNativeThread(threading.Thread):
         if not _available:
             raise RuntimeError("native automation.dll not available")
         self._obs = obs
+        # Bound once so the per-tick callbacks skip the attribute lookups
+        self._take_screenshot = obs.take_screenshot
+        self._is_recording = obs.is_recording
         self._handan = handan_dir
         self._log = logger or UiLogger()
         self._source = source_name
-        self._stop = threading.Event()
+        # Plain flag for "should we exit"; the Event only parks run() until stop()
+        self._stopping = False
+        self._wake = threading.Event()
         self._handle: Optional[int] = None
+        self._handle_cvp: Optional[ctypes.c_void_p] = None
+        self._handle_lock = threading.Lock()
         self._rq = result_queue
         self._threshold = float(threshold)
         self._rec_start_ts: Optional[float] = None
+        # Wide-string arguments encoded once; c_wchar_p argtypes accept the buffers
+        self._handan_buf = ctypes.create_unicode_buffer(self._handan)
+        self._source_buf = ctypes.create_unicode_buffer(self._source)
+        # Set by ev 3 ("stopped on exit"); _native_rec tracks whether the native
+        # side still considers itself recording (ev 1 sets, ev 2 clears)
+        self._native_done = threading.Event()
+        self._native_rec = False
+        # (monotonic time, state) of the last OBS is_recording() answer; the
+        # native detector only needs coarse edges, so it is reused for a short TTL
+        self._isrec_cache: tuple[float, Optional[bool]] = (0.0, None)
+        try:
+            self._isrec_ttl = float(os.getenv("ISREC_CACHE_TTL", "0.25") or 0.25)
+        except Exception:
+            self._isrec_ttl = 0.25
+        self._ctx: Optional[int] = None
 
-        def _cb_shot(_ctx, src, out_path):
-            try:
-                self._obs.take_screenshot(src, out_path)
-                return 0
-            except Exception:
-                return -1
-        def _cb_start(_ctx):
-            try:
-                try:
-                    method = self._obs.start_recording_diag()
-                    self._log.log(f"[録開始/停止/N] 開始メソッド: {method}")
-                except Exception:
-                    # Fallback to legacy wrapper
-                    self._obs.start_recording()
-                    self._log.log("[録開始/停止/N] 開始メソッド: legacy")
-                return 0
-            except Exception:
-                return -1
-        def _cb_stop(_ctx):
+    # --- callbacks (dispatched from the module-level trampolines) ---
+    def _on_shot(self, src, out_path) -> int:
+        try:
+            self._take_screenshot(src, out_path)
+            return 0
+        except Exception:
+            return -1
+
+    def _on_start(self) -> int:
+        try:
             try:
-                try:
-                    method = self._obs.stop_recording_diag()
-                    self._log.log(f"[録開始/停止/N] 停止メソッド: {method}")
-                except Exception:
-                    self._obs.stop_recording()
-                    self._log.log("[録開始/停止/N] 停止メソッド: legacy")
-                return 0
+                method = self._obs.start_recording_diag()
+                self._log.log(f"[録開始/停止/N] 開始メソッド: {method}")
             except Exception:
-                return -1
-        def _cb_isrec(_ctx, out_state_ptr):
+                # Fallback to legacy wrapper
+                self._obs.start_recording()
+                self._log.log("[録開始/停止/N] 開始メソッド: legacy")
+            self._isrec_cache = (0.0, None)
+            return 0
+        except Exception:
+            return -1
+
+    def _on_stop(self) -> int:
+        try:
             try:
-                st = self._obs.is_recording()
-                if st is True:
-                    out_state_ptr[0] = 1
-                elif st is False:
-                    out_state_ptr[0] = 0
-                else:
-                    out_state_ptr[0] = -1
-                return 0
+                method = self._obs.stop_recording_diag()
+                self._log.log(f"[録開始/停止/N] 停止メソッド: {method}")
             except Exception:
+                self._obs.stop_recording()
+                self._log.log("[録開始/停止/N] 停止メソッド: legacy")
+            self._isrec_cache = (0.0, None)
+            return 0
+        except Exception:
+            return -1
+
+    def _on_isrec(self, out_state_ptr) -> int:
+        try:
+            now = time.monotonic()
+            ts, st = self._isrec_cache
+            if st is None or now - ts >= self._isrec_ttl:
+                st = self._is_recording()
+                self._isrec_cache = (now, st)
+            if st is True:
+                out_state_ptr[0] = 1
+            elif st is False:
+                out_state_ptr[0] = 0
+            else:
                 out_state_ptr[0] = -1
-                return -1
-        def _cb_event(_ctx, ev, ts):
-            # 1=start, 2=stop marker, 3=stopped on exit
-            try:
-                if ev == 1:
-                    self._rec_start_ts = float(ts)
-                elif ev in (2, 3):
-                    if self._rq is not None:
-                        try:
-                            self._rq.put({"timestamp": time.time(), "type": "stop"}, timeout=0.05)
-                        except Exception:
-                            pass
-            except Exception:
-                pass
-        def _cb_log(_ctx, msg):
-            try:
-                self._log.log(msg)
-            except Exception:
-                pass
+            return 0
+        except Exception:
+            out_state_ptr[0] = -1
+            return -1
+
+    def _on_event(self, ev, ts) -> None:
+        # 1=start, 2=stop marker, 3=stopped on exit
+        if ev == 1:
+            self._rec_start_ts = float(ts)
+            self._native_rec = True
+        elif ev in (2, 3):
+            self._native_rec = False
+            if ev == 3:
+                self._native_done.set()
+            if self._rq is not None:
+                try:
+                    self._rq.put_nowait({"timestamp": time.time(), "type": "stop"})
+                except queue.Full:
+                    self._log.log("[組合せ/N] 結果キューが満杯のため停止イベントを破棄")
 
-        self._cb_shot = _CB_SHOT(_cb_shot)
-        self._cb_start = _CB_START(_cb_start)
-        self._cb_stop = _CB_STOP(_cb_stop)
-        self._cb_isrec = _CB_ISREC(_cb_isrec)
-        self._cb_event = _CB_EVENT(_cb_event)
-        self._cb_log = _CB_LOG(_cb_log)
+    def _on_log(self, msg) -> None:
+        # No try: UiLogger.log does not raise, and anything unexpected is
+        # reported by ctypes through sys.unraisablehook
+        self._log.log(msg)
 
     def stop(self) -> None:
-        self._stop.set()
-        try:
-            if self._handle:
-                _dll.stop_rkaisi_teisi(ctypes.c_void_p(self._handle))
-        except Exception:
-            pass
+        # Flag first: run() publishes the handle and then checks _stopping, so
+        # either it sees the flag and stops the handle itself, or the handle is
+        # already published for _stop_native() below. Then release run().
+        # The ctx stays registered: stop_*() does not join the detached native
+        # worker, which may still call back (run() unregisters on exit).
+        self._stopping = True
+        self._stop_native()
+        self._wake.set()
+
+    def _stop_native(self) -> None:
+        # Take the handle exactly once so stop() and run() never both stop it
+        with self._handle_lock:
+            cvp, self._handle_cvp = self._handle_cvp, None
+        if cvp is not None:
+            try:
+                _dll.stop_rkaisi_teisi(cvp)
+            except Exception:
+                pass
 
     def run(self) -> None:
         self._log.log("[録開始/停止/N] ネイティブ実装を開始")
+        self._ctx = _register(self)
         try:
+            # argtypes do the marshalling; callbacks are passed as typed pointers
             self._handle = _dll.start_rkaisi_teisi_w(
-                ctypes.c_wchar_p(self._handan),
-                ctypes.c_wchar_p(self._source),
-                ctypes.c_double(self._threshold),
-                ctypes.cast(self._cb_shot, ctypes.c_void_p),
-                ctypes.cast(self._cb_start, ctypes.c_void_p),
-                ctypes.cast(self._cb_stop, ctypes.c_void_p),
-                ctypes.cast(self._cb_isrec, ctypes.c_void_p),
-                ctypes.cast(self._cb_event, ctypes.c_void_p),
-                ctypes.cast(self._cb_log, ctypes.c_void_p),
-                None,
+                self._handan_buf,
+                self._source_buf,
+                self._threshold,
+                _tramp_shot,
+                _tramp_start,
+                _tramp_stop,
+                _tramp_isrec,
+                _tramp_event,
+                _tramp_log,
+                self._ctx,
             )
-            while not self._stop.wait(0.2):
-                pass
+            if self._handle:
+                with self._handle_lock:
+                    self._handle_cvp = ctypes.c_void_p(self._handle)
+            # stop() may have run before the handle existed
+            if self._stopping:
+                self._stop_native()
+            # Block until stop(); the DLL does the work on its own threads
+            while not self._stopping:
+                self._wake.wait()
+            # While recording, the native worker's exit path stops it and then
+            # sends ev 3; keep the ctx registered until that lands (bounded, so
+            # the UI's join deadline still holds; it also stops OBS as a last resort)
+            if self._native_rec:
+                self._native_done.wait(3.0)
         except Exception as e:
             self._log.log(f"[録開始/停止/N] エラー: {e}")
         finally:
+            # Either start failed or the native side has been stopped by now
+            _unregister(self._ctx)
             # Best-effort association of images to the last recording window
             try:
                 if self._rec_start_ts is not None:
@@ -1,23 +1,78 @@
 from __future__ import annotations
 
 import os
+import stat
 import threading
 import time
+from bisect import bisect_left, bisect_right, insort
 from collections import deque
-from typing import Deque, Dict, Optional, Tuple
-import os
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 
 from app.utils.logging import UiLogger
 from app.utils import paths as paths_utils
 from app.obs_client import ObsClient
 from app.utils import stats as stats_utils
+from app.utils.dirwatch import DirWatcher
+
+
+_IMG_EXTS: frozenset[str] = frozenset({"png", "jpg", "jpeg", "webp"})
+
+
+class ResultChannel(deque):
+    """Result/stop events from the detector threads to ResultAssociationThread.
+
+    A deque (append/popleft are atomic, so several producers are fine) with the
+    producer half of the queue.Queue API, so producers keep calling `put` /
+    `put_nowait`. Each put also wakes the consumer through an optional waker
+    instead of the consumer finding the item on its next 0.2s tick.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._waker: Optional[Callable[[], None]] = None
+
+    def set_waker(self, waker: Optional[Callable[[], None]]) -> None:
+        self._waker = waker
+
+    def put_nowait(self, item: object) -> None:
+        self.append(item)
+        waker = self._waker
+        if waker is not None:
+            try:
+                waker()
+            except Exception:
+                pass
+
+    def put(self, item: object, block: bool = True, timeout: Optional[float] = None) -> None:
+        # Unbounded: never blocks
+        self.put_nowait(item)
+
+
+def _file_id(ino: int, path: str) -> int:
+    """Identity key for _seen; falls back to the path hash on filesystems without inodes."""
+    return ino or hash(path)
+
+
+def _nearest(keys: List[float], ts: float) -> Tuple[int, float]:
+    """Index and distance of the value closest to ts in a sorted list (-1 if empty)."""
+    i = bisect_left(keys, ts)
+    idx_best = -1
+    best_delta = 1e9
+    for j in (i - 1, i):
+        if 0 <= j < len(keys):
+            d = abs(keys[j] - ts)
+            if d < best_delta:
+                best_delta = d
+                idx_best = j
+    return idx_best, best_delta
 
 
 class ResultAssociationThread(threading.Thread):
     """Associate new images in koutiku/ with detected results from SyouhaiThread.
 
     Logic:
-    - Poll koutiku for new image files and enqueue them in order of discovery.
+    - Watch koutiku for new image files (OS change notifications, or polling when
+      unavailable / DISABLE_NATIVE is set) and enqueue them in order of discovery.
     - Consume results pushed by SyouhaiThread via a shared queue and pair them
       FIFO with pending images.
     - On pair, append to CSV and add a tag to _tags.json (e.g., win/lose/disconnect).
@@ -29,7 +84,7 @@ class ResultAssociationThread(threading.Thread):
     def __init__(
         self,
         base_dir: str,
-        result_queue: "queue.Queue",
+        result_queue: "ResultChannel | queue.Queue",
         logger: Optional[UiLogger] = None,
         default_win_timeout: float = 0.0,
         obs: Optional[ObsClient] = None,
@@ -43,17 +98,32 @@ class ResultAssociationThread(threading.Thread):
         self._log = logger or UiLogger()
         self._stop = threading.Event()
         self._rq = result_queue
-        self._seen: set[str] = set()
+        # Seen files keyed by file identity (inode / NTFS file index) -> name.
+        # The name guards against inode reuse after a delete; DirEntry.inode()
+        # comes straight from the listing on POSIX, so rescans need no stat
+        self._seen: Dict[int, str] = {}
+        # path -> (size, mtime) at first sighting; promoted once a later tick
+        # sees the same values (two-tick stability instead of sleeping)
+        self._candidate: Dict[str, Tuple[int, float]] = {}
+        self._watcher: Optional[DirWatcher] = None
         # (path, timestamp)
         self._pending_images: Deque[Tuple[str, float]] = deque()
-        # result dicts: {"timestamp": float, "result": str, ...}
-        self._pending_results: Deque[Dict[str, object]] = deque()
-        # stop markers (timestamps) from recording stop events
-        self._pending_stops: Deque[float] = deque()
+        # result dicts: {"timestamp": float, "result": str, ...}, kept sorted by
+        # timestamp with the sort keys mirrored in _pending_result_ts for bisect
+        self._pending_results: List[Dict[str, object]] = []
+        self._pending_result_ts: List[float] = []
+        # stop markers (timestamps) from recording stop events, kept sorted
+        self._pending_stops: List[float] = []
         self._default_win_timeout = float(default_win_timeout or 0)
         self._first_unpaired_ts: Optional[float] = None
         self._obs = obs
         self._text_source = text_source
+        # Running [win, lose, dc] totals; this thread is the only CSV writer,
+        # so the file is read once here and then kept up to date in memory
+        try:
+            self._totals = list(stats_utils.compute_totals(stats_utils.load_results(base_dir))[:3])
+        except Exception:
+            self._totals = [0, 0, 0]
         try:
             self._tol = float(os.getenv("ASSOC_TIME_TOLERANCE_SEC", "20") or 20)
         except Exception:
@@ -69,61 +139,110 @@ class ResultAssociationThread(threading.Thread):
 
     def stop(self) -> None:
         self._stop.set()
+        w = self._watcher
+        if w is not None:
+            w.wake()
 
     def run(self) -> None:
         self._log.log("[結果連携] koutiku フォルダ監視を開始")
+        # Start watching before the snapshot so nothing created in between is lost
+        disabled = (os.getenv("DISABLE_NATIVE", "") or "").strip().lower() in ("1", "true", "yes", "on")
+        watcher = DirWatcher(self._koutiku, _IMG_EXTS, native=not disabled)
+        self._watcher = watcher
+        if isinstance(self._rq, ResultChannel):
+            self._rq.set_waker(watcher.wake)
+
         # Initialize seen files to avoid bulk processing on startup
         try:
-            for name in os.listdir(self._koutiku):
-                p = os.path.join(self._koutiku, name)
-                if os.path.isfile(p) and self._is_img(name):
-                    self._seen.add(p)
+            with os.scandir(self._koutiku) as it:
+                for e in it:
+                    if self._is_img(e.name) and e.is_file():
+                        self._seen[_file_id(e.inode(), e.path)] = e.name
         except Exception:
             pass
+        # New paths reported by the watcher (or a rescan) that are not queued yet
+        candidates: set[str] = set()
+        rescan = watcher.kind == "poll"
+        try:
+            self._watch_loop(watcher, candidates, rescan)
+        finally:
+            if isinstance(self._rq, ResultChannel):
+                self._rq.set_waker(None)
+            self._watcher = None
+            watcher.close()
+        self._log.log("[結果連携] 監視を停止")
 
+    def _watch_loop(self, watcher: DirWatcher, candidates: set, rescan: bool) -> None:
+        rq = self._rq
+        is_channel = isinstance(rq, ResultChannel)
         while not self._stop.is_set():
-            # 1) Scan for new images
+            # 1) Pick up new images: a full listing only when polling or after an
+            #    event overflow, otherwise just the names the OS reported
             try:
-                for name in sorted(os.listdir(self._koutiku)):
+                if rescan:
+                    rescan = False
+                    # DirEntry.is_file() is answered from the listing itself
+                    with os.scandir(self._koutiku) as it:
+                        for e in it:
+                            if (
+                                self._is_img(e.name)
+                                and self._seen.get(_file_id(e.inode(), e.path)) != e.name
+                                and e.is_file()
+                            ):
+                                candidates.add(e.path)
+                # Sorted so images queue in name (capture) order
+                for p in sorted(candidates):
                     if self._stop.is_set():
                         return
-                    p = os.path.join(self._koutiku, name)
-                    if p in self._seen:
-                        continue
-                    if not os.path.isfile(p) or not self._is_img(name):
-                        continue
-                    # Ensure the file is stable (size doesn't change briefly)
                     try:
-                        s1 = os.path.getsize(p)
-                        time.sleep(0.05)
-                        s2 = os.path.getsize(p)
-                        if s1 != s2:
-                            continue
+                        st = os.stat(p)
                     except Exception:
+                        st = None
+                    name = os.path.basename(p)
+                    if (
+                        st is None
+                        or not stat.S_ISREG(st.st_mode)
+                        or self._seen.get(_file_id(st.st_ino, p)) == name
+                    ):
+                        candidates.discard(p)
+                        self._candidate.pop(p, None)
                         continue
-                    # Determine image timestamp (prefer mtime)
-                    try:
-                        ts = os.path.getmtime(p)
-                    except Exception:
-                        ts = time.time()
-                    self._seen.add(p)
+                    # Ensure the file is stable: size/mtime unchanged since the
+                    # previous tick. inotify only reports files after the writer
+                    # closed them, so those are taken at once
+                    if not watcher.closes_complete:
+                        snap = (st.st_size, st.st_mtime)
+                        if self._candidate.get(p) != snap:
+                            self._candidate[p] = snap
+                            continue
+                        del self._candidate[p]
+                    # Image timestamp is the mtime
+                    ts = st.st_mtime
+                    candidates.discard(p)
+                    self._seen[_file_id(st.st_ino, p)] = name
                     self._pending_images.append((p, ts))
                     if self._first_unpaired_ts is None:
                         self._first_unpaired_ts = time.time()
-                    self._log.log(f"[結果連携] 新規画像: {os.path.basename(p)}")
+                    self._log.log(f"[結果連携] 新規画像: {name}")
             except Exception as e:
                 self._log.log(f"[結果連携] スキャンエラー: {e}")
 
             # 2) Drain any available results quickly (non-blocking)
             try:
                 while True:
-                    item = self._rq.get_nowait()
+                    if is_channel:
+                        try:
+                            item = rq.popleft()
+                        except IndexError:
+                            break
+                    else:
+                        item = rq.get_nowait()
                     if isinstance(item, dict):
                         ts = float(item.get("timestamp") or time.time())
                         if "result" in item:
-                            self._pending_results.append(item)
+                            self._push_result(item)
                         elif str(item.get("type", "")).lower() == "stop":
-                            self._pending_stops.append(ts)
+                            insort(self._pending_stops, ts)
                         else:
                             self._log.log("[結果連携] 未知の結果オブジェクトを受信")
                     else:
@@ -143,82 +262,55 @@ class ResultAssociationThread(threading.Thread):
             ):
                 if time.time() - self._first_unpaired_ts >= self._default_win_timeout:
                     # synthesize a win result
-                    self._pending_results.append({"timestamp": time.time(), "result": "win", "synthetic": True})
+                    self._push_result({"timestamp": time.time(), "result": "win", "synthetic": True})
                     self._log.log("[結果連携] タイムアウトのため '勝ち' を割当")
                     self._pair_items()
 
-            if self._stop.wait(0.2):
+            # Keep a 0.2s tick for the default-win timeout and plain queues (a
+            # ResultChannel wakes the watcher on put); the folder itself is only
+            # rescanned when the watcher cannot report names
+            changed = watcher.wait(0.2)
+            if self._stop.is_set():
                 return
-
-        self._log.log("[結果連携] 監視を停止")
+            if changed is None:
+                rescan = True
+            else:
+                # Already-seen names are dropped by the stat in the next pass
+                candidates.update(changed)
 
     # --- internals ---
     def _pair_items(self) -> None:
         def _pop_best_result_for(ts_img: float) -> Optional[Dict[str, object]]:
-            if not self._pending_results:
-                return None
             # Choose result with smallest |ts - ts_img| if within tolerance
-            idx_best = -1
-            best_delta = 1e9
-            for i, r in enumerate(self._pending_results):
-                try:
-                    tr = float(r.get("timestamp") or 0)
-                except Exception:
-                    continue
-                d = abs(tr - ts_img)
-                if d < best_delta:
-                    best_delta = d
-                    idx_best = i
+            idx_best, best_delta = _nearest(self._pending_result_ts, ts_img)
             if idx_best >= 0 and best_delta <= self._tol:
-                _lst = list(self._pending_results)
-                item = _lst.pop(idx_best)
-                self._pending_results = deque(_lst)
-                return item
+                del self._pending_result_ts[idx_best]
+                return self._pending_results.pop(idx_best)
             return None
 
         def _pop_stop_for(ts_img: float) -> Optional[float]:
             # Choose a stop marker within tolerance closest to image ts
-            if not self._pending_stops:
-                return None
-            idx_best = -1
-            best_delta = 1e9
-            for i, t in enumerate(self._pending_stops):
-                d = abs(t - ts_img)
-                if d < best_delta:
-                    best_delta = d
-                    idx_best = i
+            idx_best, best_delta = _nearest(self._pending_stops, ts_img)
             if idx_best >= 0 and best_delta <= self._tol:
-                t = self._pending_stops[idx_best]
-                # remove by index
-                self._pending_stops = deque([v for j, v in enumerate(self._pending_stops) if j != idx_best])
-                return t
+                return self._pending_stops.pop(idx_best)
             return None
 
+        # CSV rows and tag updates are collected and written once per round
+        csv_rows: List[Tuple[str, str, float]] = []
+        tag_updates: List[Tuple[str, List[str]]] = []
+        any_synthetic = False
+
         def _apply_pair(img_path: str, result: str, ts_res: float, synthetic: bool = False) -> None:
+            nonlocal any_synthetic
             name = os.path.basename(img_path)
-            # Append to CSV and tag file
-            try:
-                stats_utils.append_result(self._base, name, result, ts_res, season=self._season)
-            except Exception as e:
-                self._log.log(f"[結果連携] CSV 追記失敗: {e}")
-            try:
-                tags = [result]
-                if self._season:
-                    tags.append(f"season:{self._season}")
-                stats_utils.add_tags(self._base, name, tags)
-            except Exception as e:
-                self._log.log(f"[結果連携] タグ付け失敗: {e}")
+            csv_rows.append((name, result, ts_res))
+            tags = [result]
+            if self._season:
+                tags.append(f"season:{self._season}")
+            tag_updates.append((name, tags))
             self._log.log(f"[結果連携] {name} -> {result}")
-
-            # If this was synthetic, update OBS text source counters from totals
-            if synthetic and self._obs is not None:
-                try:
-                    rows = stats_utils.load_results(self._base)
-                    win, lose, dc, _wr = stats_utils.compute_totals(rows)
-                    text = f"Win: {win} - Lose: {lose} - DC: {dc}"
-                    self._obs.update_text_source(self._text_source, text)
-                except Exception:
-                    pass
+            if synthetic:
+                any_synthetic = True
 
         # Main pairing loop
         while self._pending_images:
@@ -245,9 +337,42 @@ class ResultAssociationThread(threading.Thread):
             # Cannot pair (yet); wait for more results/stops
             break
 
+        # Append to CSV and tag file
+        if csv_rows:
+            try:
+                stats_utils.append_results_bulk(self._base, csv_rows, season=self._season)
+                for _name, result, _ts in csv_rows:
+                    # Same buckets as stats.compute_totals
+                    self._totals[1 if result == "lose" else 2 if result == "disconnect" else 0] += 1
+            except Exception as e:
+                self._log.log(f"[結果連携] CSV 追記失敗: {e}")
+            try:
+                stats_utils.add_tags_bulk(self._base, tag_updates)
+            except Exception as e:
+                self._log.log(f"[結果連携] タグ付け失敗: {e}")
+
+        # If any pair was synthetic, update OBS text source counters from totals
+        if any_synthetic and self._obs is not None:
+            try:
+                win, lose, dc = self._totals
+                text = f"Win: {win} - Lose: {lose} - DC: {dc}"
+                self._obs.update_text_source(self._text_source, text)
+            except Exception:
+                pass
+
         if not self._pending_images:
             self._first_unpaired_ts = None
 
+    def _push_result(self, item: Dict[str, object]) -> None:
+        try:
+            tr = float(item.get("timestamp") or 0)
+        except Exception:
+            tr = 0.0
+        # Insert after equal keys so ties keep arrival order
+        i = bisect_right(self._pending_result_ts, tr)
+        self._pending_result_ts.insert(i, tr)
+        self._pending_results.insert(i, item)
+
     def _is_img(self, name: str) -> bool:
-        ext = os.path.splitext(name)[1].lower()
-        return ext in {".png", ".jpg", ".jpeg", ".webp"}
+        i = name.rfind(".")
+        return i >= 0 and name[i + 1:].lower() in _IMG_EXTS
@@ -9,7 +9,16 @@ import queue
 import cv2
 
 from app.obs_client import ObsClient
-from app.utils.image import Rect, crop_image_by_rect, match_template
+from app.utils.image import (
+    Rect,
+    coords_to_slices,
+    dhash,
+    hamming64,
+    match_same_size,
+    match_template,
+    template_stats,
+    to_gray,
+)
 from app.utils.logging import UiLogger
 from app.utils import pairs as pairs_utils
 
@@ -22,6 +31,10 @@ except Exception:
     _NativeRkaisi = None  # type: ignore
 
 
+# Seconds the file route is used after an in-memory screenshot failed
+_MEM_RETRY_SEC = 30.0
+
+
 class PyRkaisiTeisiThread(threading.Thread):
     """Start/Stop OBS recording depending on template presence.
 
@@ -56,10 +69,65 @@ class PyRkaisiTeisiThread(threading.Thread):
         self._mark_tpl = os.path.join(self._base, "mark.png")
         self._masu1_crop = os.path.join(self._base, "masu1cropped.png")
         self._mark_crop = os.path.join(self._base, "markcropped.png")
+        # Crops (masu1cropped.png / markcropped.png) are only written for debugging
+        self._debug = (os.getenv("RKAISI_DEBUG", "0") or "0").strip().lower() not in ("0", "false", "no")
+        # Grab screenshots in memory; after a failure the file route is used
+        # until this monotonic time, then memory is tried again
+        self._mem_retry_at = 0.0
+        # Frames up to this old (s) captured by another thread are reused
+        try:
+            self._frame_max_age = float((os.getenv("SHARED_FRAME_MAX_AGE", "0.05") or 0.05))
+        except Exception:
+            self._frame_max_age = 0.05
+        # Decoded templates, reloaded only when a file's mtime changes
+        self._tpl_mtimes: Optional[tuple] = None
+        self._tpl_checked = 0.0
+        self._masu_tpl = None
+        self._mark_tpl_img = None
+        self._masu_dhash: Optional[int] = None
+        self._mark_dhash: Optional[int] = None
+        # Zero-mean template and norm for same-size NCC (see image.match_same_size)
+        self._masu_stats = None
+        self._mark_stats = None
+        # Optional half-resolution mode: frames decoded with IMREAD_REDUCED_COLOR_2,
+        # rects and templates scaled by 1/2 to match (a quarter of the match work)
+        self._half = (os.getenv("RKAISI_HALF_RES", "0") or "0").strip().lower() not in ("0", "false", "no")
+        self._read_flags = cv2.IMREAD_REDUCED_COLOR_2 if self._half else cv2.IMREAD_COLOR
+        # dHash prefilter: Hamming distances above this skip the correlation
+        # (64 disables). Only used when a template spans most of its ROI.
+        try:
+            self._dhash_max = int((os.getenv("RKAISI_DHASH_MAX", "20") or 20))
+        except Exception:
+            self._dhash_max = 20
+        # Optional CUDA matching (RKAISI_CUDA=1) for templates smaller than their
+        # ROI; same-size templates stay on the CPU closed form, cheaper than an upload
+        self._cuda_matcher = None
+        self._gpu_roi = None
+        self._gpu_tpls: dict = {}
+        if (os.getenv("RKAISI_CUDA", "0") or "0").strip().lower() not in ("0", "false", "no"):
+            try:
+                if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+                    self._cuda_matcher = cv2.cuda.createTemplateMatching(cv2.CV_8UC1, cv2.TM_CCOEFF_NORMED)
+                    self._gpu_roi = cv2.cuda_GpuMat()
+                else:
+                    self._log.log("[録開始/停止] CUDA デバイスがないため CPU でマッチします")
+            except Exception as e:
+                self._cuda_matcher = None
+                self._log.log(f"[録開始/停止] CUDA を利用できないため CPU でマッチします: {e}")
+        self._load_templates()
 
         # Rects
         self._masu1_rect: Rect = ((1541, 229), (1651, 843))
         self._mark_rect: Rect = ((0, 0), (96, 72))
+        if self._half:
+            self._masu1_rect, self._mark_rect = (
+                ((x1 // 2, y1 // 2), (x2 // 2, y2 // 2))
+                for ((x1, y1), (x2, y2)) in (self._masu1_rect, self._mark_rect)
+            )
+        # Same rects as (row, col) slices: the ROIs are taken as views of the frame
+        self._masu1_slice, self._mark_slice = coords_to_slices(
+            [(x1, y1, x2, y2) for ((x1, y1), (x2, y2)) in (self._masu1_rect, self._mark_rect)]
+        )
         # Poll/guard durations (seconds), tunable via env. Defaults preserve prior behavior.
         try:
             import os as _os
@@ -71,6 +139,18 @@ class PyRkaisiTeisiThread(threading.Thread):
             self._guard_sec = float((_os.getenv("RKAISI_GUARD_SEC", "140") or 140))
         except Exception:
             self._guard_sec = 140.0
+        # Tick period between screenshots: the start trigger is not sub-second
+        # critical, the stop trigger (mark) is polled faster while recording
+        try:
+            self._idle_period = float((os.getenv("RKAISI_IDLE_POLL_SEC", "0.5") or 0.5))
+        except Exception:
+            self._idle_period = 0.5
+        try:
+            self._rec_period = float((os.getenv("RKAISI_REC_POLL_SEC", "0.2") or 0.2))
+        except Exception:
+            self._rec_period = 0.2
+        # Backoff after failed grabs (doubles up to 8 s, reset on success)
+        self._miss_wait = 0.5
 
     def stop(self) -> None:
         self._stop.set()
@@ -114,29 +194,171 @@ class PyRkaisiTeisiThread(threading.Thread):
             self._log.log("[録開始/停止] スレッド停止")
 
     # --- internals ---
+    def _load_templates(self) -> None:
+        """Decode masu1/mark templates (grayscale) once; re-read only if a file's mtime changes.
+
+        The mtimes are checked at most every 2 s, not on every tick.
+        """
+        now = time.monotonic()
+        if self._tpl_mtimes is not None and now - self._tpl_checked < 2.0:
+            return
+        self._tpl_checked = now
+        mtimes = []
+        for p in (self._masu1_tpl, self._mark_tpl):
+            try:
+                mtimes.append(os.stat(p).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        key = tuple(mtimes)
+        if key == self._tpl_mtimes:
+            return
+        self._tpl_mtimes = key
+        # Kept as grayscale: matching runs single-channel
+        masu = cv2.imread(self._masu1_tpl)
+        mark = cv2.imread(self._mark_tpl)
+        self._masu_tpl = self._prep_template(masu)
+        self._mark_tpl_img = self._prep_template(mark)
+        self._masu_dhash = dhash(self._masu_tpl) if self._masu_tpl is not None else None
+        self._mark_dhash = dhash(self._mark_tpl_img) if self._mark_tpl_img is not None else None
+        self._masu_stats = template_stats(self._masu_tpl) if self._masu_tpl is not None else None
+        self._mark_stats = template_stats(self._mark_tpl_img) if self._mark_tpl_img is not None else None
+        # GPU copies are uploaded again on first use after a reload
+        self._gpu_tpls = {}
+
+    def _prep_template(self, img):
+        """Grayscale (and halve in half-res mode) a decoded template; None passes through."""
+        if img is None:
+            return None
+        gray = to_gray(img)
+        if self._half:
+            gray = cv2.resize(gray, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+        return gray
+
+    def _grab_scene(self):
+        """Return the current scene as a BGR array.
+
+        Decodes the screenshot straight from the WebSocket reply instead of
+        having OBS write scene2.png and reading it back (the file is still
+        written when RKAISI_DEBUG is on). Falls back to the file route for a
+        while when OBS does not return image data.
+        """
+        if time.monotonic() >= self._mem_retry_at:
+            try:
+                # Shared with other detector threads polling the same source
+                img = self._obs.get_latest_frame(self._source, self._frame_max_age, self._read_flags)
+            except Exception as e:
+                # Often transient (timeout, reconnect): retry memory after a cooldown
+                self._mem_retry_at = time.monotonic() + _MEM_RETRY_SEC
+                self._log.log(f"[録開始/停止] メモリ取得に失敗したため {_MEM_RETRY_SEC:.0f} 秒間ファイル経由に切替: {e}")
+            else:
+                if img is not None and self._debug:
+                    cv2.imwrite(self._scene_path, img)
+                return img
+        self._obs.take_screenshot(self._source, self._scene_path)
+        return cv2.imread(self._scene_path, self._read_flags)
+
+    def _await_recording(self, want: bool, iters: int) -> Tuple[bool, int]:
+        """Wait until OBS reports recording == `want` (about iters * 0.2 s).
+
+        Uses OBS's record state events when the session has them, else polls
+        is_recording(). Waits in 0.2 s steps so stop() cuts it short; the state
+        is then checked once more so a recording that did start is not lost.
+        Returns (reached, number of polls that were unknown).
+        """
+        use_events = True
+        for _ in range(iters):
+            try:
+                got = self._obs.wait_recording_state(want, 0.2)
+            except Exception:
+                got = None
+            if got is None:
+                use_events = False
+                break
+            if got:
+                return True, 0
+            if self._stop.is_set():
+                break
+        if use_events:
+            # No event in time (or stopping): confirm with one status request
+            st = self._obs.is_recording()
+            return st is want, (iters if st is None else 0)
+        unknown = 0
+        for _ in range(iters):
+            st = self._obs.is_recording()
+            if st is want:
+                return True, unknown
+            if st is None:
+                unknown += 1
+            if self._stop.wait(0.2):
+                st = self._obs.is_recording()
+                return st is want, unknown
+        return False, unknown
+
+    def _matches(self, roi, tpl, tpl_dhash: Optional[int], tpl_stats=None) -> bool:
+        """Grayscale NCC of `tpl` in `roi`, behind a cheap dHash reject."""
+        roi_gray = to_gray(roi)
+        rh, rw = roi_gray.shape[:2]
+        th, tw = tpl.shape[:2]
+        # A whole-image hash only says something when the template is close to ROI size
+        if (
+            tpl_dhash is not None
+            and self._dhash_max < 64
+            and th * 2 >= rh
+            and tw * 2 >= rw
+            and hamming64(dhash(roi_gray), tpl_dhash) > self._dhash_max
+        ):
+            # Clearly a different screen: skip the cross-correlation
+            return False
+        if tpl_stats is not None and (rh, rw) == (th, tw):
+            # Template fills the ROI: one NCC value, computed with the cached template stats
+            return match_same_size(roi_gray, tpl_stats, self.MATCH_THRESHOLD)
+        if self._cuda_matcher is not None:
+            try:
+                return self._match_cuda(roi_gray, tpl)
+            except Exception as e:
+                self._cuda_matcher = None
+                self._log.log(f"[録開始/停止] CUDA マッチに失敗したため CPU に切替: {e}")
+        return match_template(roi_gray, tpl, self.MATCH_THRESHOLD, grayscale=False)
+
+    def _match_cuda(self, roi_gray, tpl) -> bool:
+        """TM_CCOEFF_NORMED on the GPU: the template stays resident, only the ROI is uploaded."""
+        gpu_tpl = self._gpu_tpls.get(id(tpl))
+        if gpu_tpl is None:
+            gpu_tpl = cv2.cuda_GpuMat()
+            gpu_tpl.upload(tpl)
+            self._gpu_tpls[id(tpl)] = gpu_tpl
+        self._gpu_roi.upload(roi_gray)
+        res = self._cuda_matcher.match(self._gpu_roi, gpu_tpl).download()
+        _, max_val, _, _ = cv2.minMaxLoc(res)
+        return max_val >= self.MATCH_THRESHOLD
+
     def _loop(self) -> None:
         # Screenshot and crop
-        self._obs.take_screenshot(self._source, self._scene_path)
-        img = cv2.imread(self._scene_path)
+        img = self._grab_scene()
         if img is None:
-            if self._stop.wait(0.5):
-                return
+            wait = self._miss_wait
+            self._miss_wait = min(wait * 2, 8.0)
+            self._stop.wait(wait)
             return
+        self._miss_wait = 0.5
 
-        masu1_crop_img = crop_image_by_rect(img, self._masu1_rect)
-        mark_crop_img = crop_image_by_rect(img, self._mark_rect)
-        cv2.imwrite(self._masu1_crop, masu1_crop_img)
-        cv2.imwrite(self._mark_crop, mark_crop_img)
+        # Only the ROI for the current state is consulted: masu1 starts a
+        # recording, mark stops it
+        recording = self._recording
+        roi = img[self._mark_slice] if recording else img[self._masu1_slice]
+        if self._debug:
+            cv2.imwrite(self._mark_crop if recording else self._masu1_crop, roi)
 
-        masu_tpl = cv2.imread(self._masu1_tpl)
-        mark_tpl = cv2.imread(self._mark_tpl)
+        self._load_templates()
+        masu_tpl, mark_tpl = self._masu_tpl, self._mark_tpl_img
         if masu_tpl is None or mark_tpl is None:
             self._log.log("[録開始/停止] テンプレートが見つからないため待機")
             if self._stop.wait(1):
                 return
             return
 
-        if (not self._recording) and match_template(masu1_crop_img, masu_tpl, self.MATCH_THRESHOLD, grayscale=False):
+        # Single-channel NCC on the small ROIs: a third of the work of matching BGR
+        if (not recording) and self._matches(roi, masu_tpl, self._masu_dhash, self._masu_stats):
             self._log.log("[録開始/停止] 'masu1' 検出 → 録画開始")
             started = False
             unknown_count = 0
@@ -148,16 +370,10 @@ class PyRkaisiTeisiThread(threading.Thread):
                     # Fallback to legacy wrapper
                     self._obs.start_recording()
                     self._log.log("[録開始/停止] 開始メソッド: legacy")
-                # Verify it actually started (poll briefly)
+                # Verify it actually started
                 iters = max(1, int(self._poll_sec / 0.2))
-                for _ in range(iters):
-                    st = self._obs.is_recording()
-                    if st is True:
-                        started = True
-                        break
-                    if st is None:
-                        unknown_count += 1
-                    time.sleep(0.2)
+                started, unknown = self._await_recording(True, iters)
+                unknown_count += unknown
                 # One retry if not started
                 if not started:
                     try:
@@ -166,14 +382,8 @@ class PyRkaisiTeisiThread(threading.Thread):
                     except Exception:
                         self._obs.start_recording()
                         self._log.log("[録開始/停止] 再試行メソッド: legacy")
-                    for _ in range(iters):
-                        st = self._obs.is_recording()
-                        if st is True:
-                            started = True
-                            break
-                        if st is None:
-                            unknown_count += 1
-                        time.sleep(0.2)
+                    started, unknown = self._await_recording(True, iters)
+                    unknown_count += unknown
             except Exception as e:
                 self._log.log(f"[録開始/停止] 録画開始に失敗: {e}")
                 started = False
@@ -201,7 +411,7 @@ class PyRkaisiTeisiThread(threading.Thread):
                     return
                 return
 
-        if self._recording and match_template(mark_crop_img, mark_tpl, self.MATCH_THRESHOLD, grayscale=False):
+        if recording and self._matches(roi, mark_tpl, self._mark_dhash, self._mark_stats):
             self._log.log("[録開始/停止] 'mark' 検出 → 録画停止")
             # Emit a stop marker for association/default-win logic
             try:
@@ -212,20 +422,10 @@ class PyRkaisiTeisiThread(threading.Thread):
             stopped = False
             try:
                 self._obs.stop_recording()
-                for _ in range(10):
-                    st = self._obs.is_recording()
-                    if st is False:
-                        stopped = True
-                        break
-                    time.sleep(0.2)
+                stopped, _unknown = self._await_recording(False, 10)
                 if not stopped:
                     self._obs.stop_recording()
-                    for _ in range(10):
-                        st = self._obs.is_recording()
-                        if st is False:
-                            stopped = True
-                            break
-                        time.sleep(0.2)
+                    stopped, _unknown = self._await_recording(False, 10)
             except Exception as e:
                 self._log.log(f"[録開始/停止] 録画停止に失敗: {e}")
                 stopped = False
@@ -239,8 +439,8 @@ class PyRkaisiTeisiThread(threading.Thread):
                     pass
                 self._rec_start_ts = None
                 self._recording = False if stopped else self._recording
-            if self._stop.wait(0.5):
-                return
+
+        self._stop.wait(self._rec_period if self._recording else self._idle_period)
 
 
 class RkaisiTeisiThread(threading.Thread):
@@ -254,6 +454,10 @@ class RkaisiTeisiThread(threading.Thread):
     def __init__(self, obs: ObsClient, base_dir: str, logger: Optional[UiLogger] = None, source_name: str = "Capture1", result_queue: Optional["queue.Queue"] = None) -> None:
         self._use_native = bool(_native_ok())
         self._th: Optional[threading.Thread]
+        # Release builds can insist on the DLL instead of silently running the Python matcher
+        require = (os.getenv("RKAISI_REQUIRE_NATIVE", "0") or "0").strip().lower() not in ("0", "false", "no")
+        if require and not (self._use_native and _NativeRkaisi is not None):
+            raise RuntimeError("native automation.dll not available (RKAISI_REQUIRE_NATIVE=1)")
         if self._use_native and _NativeRkaisi is not None:
             # Native expects handan dir (where scene2.png and templates live)
             # Allow raising/lowering match threshold via env for native path too
@@ -5,7 +5,6 @@ import hashlib
 import re
 import sys
 import threading
-import queue
 import concurrent.futures
 import tkinter as tk
 import tkinter.filedialog as fd
@@ -22,12 +21,12 @@ import customtkinter as ctk
 from PIL import Image
 import webbrowser
 
-from app.obs_client import ObsClient
+from app.obs_client import ObsClient, ObsClientPool
 from app.threads.double_battle import DoubleBattleThread
 from app.threads.rkaisi_teisi import RkaisiTeisiThread
 from app.threads.syouhai import SyouhaiThread
 from app.threads.discord_webhook import DiscordWebhookThread
-from app.threads.result_association import ResultAssociationThread
+from app.threads.result_association import ResultAssociationThread, ResultChannel
 from app.utils.logging import UiLogger
 from app.version import VERSION as APP_VERSION
 from app.utils import stats as stats_utils
@@ -64,14 +63,14 @@ class App(ctk.CTk):
             pass
 
         # Runtime state
-        self._obs: Optional[ObsClient] = None
-        self._lock = threading.Lock()
+        self._obs: Optional[ObsClient | ObsClientPool] = None
+        self._lock = threading.RLock()
         self._th_double: Optional[DoubleBattleThread] = None
         self._th_rkaisi: Optional[RkaisiTeisiThread] = None
         self._th_syouhai: Optional[SyouhaiThread] = None
         self._th_discord: Optional[DiscordWebhookThread] = None
         self._th_result_assoc: Optional[ResultAssociationThread] = None
-        self._results_queue: Optional[queue.Queue] = None
+        self._results_queue: Optional[ResultChannel] = None
 
         # Widgets
         self.host_entry: ctk.CTkEntry
@@ -798,8 +797,17 @@ class App(ctk.CTk):
                 pass
             self._obs = None
         try:
-            self._obs = ObsClient(host, port, password, self._lock)
-            self._obs.connect()
+            # OBS_POOL_SIZE > 1 gives screenshot workers their own OBS sessions
+            try:
+                pool_size = int(os.getenv("OBS_POOL_SIZE", "1") or 1)
+            except Exception:
+                pool_size = 1
+            if pool_size > 1:
+                self._obs = ObsClientPool(host, port, password, size=pool_size, lock=self._lock)
+            else:
+                self._obs = ObsClient(host, port, password, self._lock)
+            # One attempt: this runs on the Tk thread, where backoff sleeps freeze the UI
+            self._obs.connect(max_attempts=1)
             mb.showinfo("接続", f"OBS WebSocket に接続しました: {host}:{port}")
             self._append_log("[アプリ] OBSに接続しました")
             # Persist settings on successful connect
@@ -848,13 +856,17 @@ class App(ctk.CTk):
             self._th_double.start()
         # Result association queue shared between Syouhai and association thread
         # Create upfront so multiple producers (Syouhai, RkaisiTeisi) can push events
-        self._results_queue = queue.Queue()
+        self._results_queue = ResultChannel()
 
         if self.chk_rkaisi_var.get():
             handantmp = os.path.join(base_dir, "handantmp")
             os.makedirs(handantmp, exist_ok=True)
-            self._th_rkaisi = RkaisiTeisiThread(self._obs, handantmp, logger, source_name=src, result_queue=self._results_queue)
-            self._th_rkaisi.start()
+            try:
+                self._th_rkaisi = RkaisiTeisiThread(self._obs, handantmp, logger, source_name=src, result_queue=self._results_queue)
+                self._th_rkaisi.start()
+            except Exception as e:
+                mb.showerror("録開始/停止", f"録開始/停止スレッドを開始できません。\n{e}")
+                self._append_log(f"[録開始/停止] 開始できません: {e}")
         if self.chk_syouhai_var.get():
             self._th_syouhai = SyouhaiThread(self._obs, base_dir, logger, source_name=src, result_queue=self._results_queue)
             self._th_syouhai.start()
@@ -1272,6 +1284,7 @@ class App(ctk.CTk):
             try:
                 for k, v in cfg.items():
                     os.environ[k] = v
+                ObsClient.reload_env()
             except Exception:
                 pass
         except Exception as e:
@@ -1304,7 +1317,7 @@ class App(ctk.CTk):
                     mb.showerror("入力エラー", "OBS 接続情報を確認してください")
                     return
                 client = ObsClient(host, port, password, self._lock)
-                client.connect()
+                client.connect(max_attempts=1)
                 created_temp = True
             folder = None
             try:
@@ -2823,17 +2836,16 @@ class App(ctk.CTk):
         try:
             if client is None:
                 client = ObsClient(host, port, password, self._lock)
-                client.connect()
+                client.connect(max_attempts=1)
                 created_temp = True
             scenes = []
             sources = []
             try:
-                scenes = client.list_scenes()
+                snap = client.refresh_metadata()
+                scenes = snap.scenes
+                sources = snap.sources
             except Exception:
                 scenes = []
-            try:
-                sources = client.list_sources()
-            except Exception:
                 sources = []
 
             # Update UI lists
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import os
+import select
+import struct
+import sys
+import threading
+from typing import Iterable, Optional
+
+try:
+    import ctypes
+    import ctypes.util
+except Exception:  # pragma: no cover
+    ctypes = None  # type: ignore
+
+
+# inotify(7) constants
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_IN_EVENT = struct.Struct("iIII")
+
+# ReadDirectoryChangesW constants
+_FILE_LIST_DIRECTORY = 0x0001
+_FILE_SHARE_ALL = 0x00000007
+_OPEN_EXISTING = 3
+_FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+_FILE_FLAG_OVERLAPPED = 0x40000000
+_FILE_NOTIFY_CHANGE_FILE_NAME = 0x00000001
+_FILE_NOTIFY_CHANGE_LAST_WRITE = 0x00000010
+_FILE_ACTIONS = (1, 3, 5)  # ADDED, MODIFIED, RENAMED_NEW_NAME
+_WAIT_OBJECT_0 = 0
+_WAIT_TIMEOUT = 0x102
+_INFINITE = 0xFFFFFFFF
+_FNI_HEADER = struct.Struct("III")
+
+
+class DirWatcher:
+    """Wait for files to appear in one directory without rescanning it.
+
+    - Linux: inotify (IN_CLOSE_WRITE / IN_MOVED_TO), so events arrive only after
+      the writer has closed or renamed the file.
+    - Windows: ReadDirectoryChangesW with an overlapped read; names may be
+      reported while still being written, so callers should keep a debounce.
+    - Elsewhere (or on any setup failure, or with `native=False`) `kind` is
+      "poll" and `wait()` just sleeps, signalling the caller to rescan.
+
+    `wait(timeout)` returns a list of changed paths (possibly empty on timeout
+    or `wake()`), or None when the caller should rescan the directory.
+    """
+
+    def __init__(self, path: str, exts: Optional[Iterable[str]] = None, native: bool = True) -> None:
+        self._path = path
+        self._exts = {e.lower().lstrip(".") for e in exts} if exts else None
+        self._wake_evt = threading.Event()
+        self.kind = "poll"
+        self._closed = False
+        if not native:
+            return
+        try:
+            if sys.platform.startswith("linux"):
+                self._init_inotify()
+            elif os.name == "nt":
+                self._init_win32()
+        except Exception:
+            self.kind = "poll"
+
+    # --- public ---
+    @property
+    def closes_complete(self) -> bool:
+        """True when reported files are already fully written."""
+        return self.kind == "inotify"
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[list[str]]:
+        if self.kind == "inotify":
+            return self._wait_inotify(timeout)
+        if self.kind == "win32":
+            return self._wait_win32(timeout)
+        self._wake_evt.wait(2.0 if timeout is None else timeout)
+        self._wake_evt.clear()
+        return None
+
+    def wake(self) -> None:
+        """Make a blocked `wait()` return early (safe from any thread)."""
+        self._wake_evt.set()
+        try:
+            if self.kind == "inotify":
+                os.write(self._wake_w, b"x")
+            elif self.kind == "win32":
+                self._k32.SetEvent(self._stop_ev)
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self.kind == "inotify":
+                for fd in (self._fd, self._wake_r, self._wake_w):
+                    try:
+                        os.close(fd)
+                    except Exception:
+                        pass
+            elif self.kind == "win32":
+                k32 = self._k32
+                try:
+                    k32.CancelIoEx(self._handle, None)
+                except Exception:
+                    pass
+                for h in (self._handle, self._io_ev, self._stop_ev):
+                    try:
+                        k32.CloseHandle(h)
+                    except Exception:
+                        pass
+        except Exception:
+            pass
+
+    def _wanted(self, name: str) -> bool:
+        if self._exts is None:
+            return True
+        _stem, dot, ext = name.rpartition(".")
+        return bool(dot) and ext.lower() in self._exts
+
+    # --- inotify ---
+    def _init_inotify(self) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        wd = libc.inotify_add_watch(fd, os.fsencode(self._path), _IN_CLOSE_WRITE | _IN_MOVED_TO)
+        if wd < 0:
+            os.close(fd)
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._fd = fd
+        self.kind = "inotify"
+
+    def _wait_inotify(self, timeout: Optional[float]) -> Optional[list[str]]:
+        readable, _w, _x = select.select([self._fd, self._wake_r], [], [], timeout)
+        if self._wake_r in readable:
+            try:
+                os.read(self._wake_r, 64)
+            except Exception:
+                pass
+        if self._fd not in readable:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        out: list[str] = []
+        off = 0
+        end = len(data)
+        while off + _IN_EVENT.size <= end:
+            _wd, mask, _cookie, nlen = _IN_EVENT.unpack_from(data, off)
+            off += _IN_EVENT.size
+            raw = data[off:off + nlen]
+            off += nlen
+            if mask & _IN_Q_OVERFLOW:
+                return None
+            if mask & _IN_ISDIR or not raw:
+                continue
+            name = os.fsdecode(raw.rstrip(b"\0"))
+            if self._wanted(name):
+                out.append(os.path.join(self._path, name))
+        return out
+
+    # --- ReadDirectoryChangesW ---
+    def _init_win32(self) -> None:
+        from ctypes import wintypes
+
+        class _OVERLAPPED(ctypes.Structure):
+            _fields_ = [
+                ("Internal", ctypes.c_void_p),
+                ("InternalHigh", ctypes.c_void_p),
+                ("Offset", wintypes.DWORD),
+                ("OffsetHigh", wintypes.DWORD),
+                ("hEvent", wintypes.HANDLE),
+            ]
+
+        k32 = ctypes.WinDLL("kernel32", use_last_error=True)  # type: ignore[attr-defined]
+        k32.CreateFileW.restype = wintypes.HANDLE
+        k32.CreateFileW.argtypes = [
+            wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, ctypes.c_void_p,
+            wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE,
+        ]
+        k32.CreateEventW.restype = wintypes.HANDLE
+        k32.CreateEventW.argtypes = [ctypes.c_void_p, wintypes.BOOL, wintypes.BOOL, wintypes.LPCWSTR]
+        k32.ReadDirectoryChangesW.argtypes = [
+            wintypes.HANDLE, ctypes.c_void_p, wintypes.DWORD, wintypes.BOOL, wintypes.DWORD,
+            ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
+        ]
+        k32.GetOverlappedResult.argtypes = [wintypes.HANDLE, ctypes.c_void_p, ctypes.c_void_p, wintypes.BOOL]
+        k32.WaitForMultipleObjects.restype = wintypes.DWORD
+        k32.WaitForMultipleObjects.argtypes = [wintypes.DWORD, ctypes.c_void_p, wintypes.BOOL, wintypes.DWORD]
+        k32.SetEvent.argtypes = [wintypes.HANDLE]
+        k32.ResetEvent.argtypes = [wintypes.HANDLE]
+        k32.CancelIoEx.argtypes = [wintypes.HANDLE, ctypes.c_void_p]
+        k32.CloseHandle.argtypes = [wintypes.HANDLE]
+
+        handle = k32.CreateFileW(
+            self._path, _FILE_LIST_DIRECTORY, _FILE_SHARE_ALL, None, _OPEN_EXISTING,
+            _FILE_FLAG_BACKUP_SEMANTICS | _FILE_FLAG_OVERLAPPED, None,
+        )
+        if not handle or handle == ctypes.c_void_p(-1).value:
+            raise OSError(ctypes.get_last_error(), "CreateFileW failed")
+        self._k32 = k32
+        self._handle = handle
+        self._io_ev = k32.CreateEventW(None, True, False, None)
+        self._stop_ev = k32.CreateEventW(None, True, False, None)
+        self._ov = _OVERLAPPED()
+        self._ov.hEvent = self._io_ev
+        # DWORD-aligned buffer as required by ReadDirectoryChangesW
+        self._buf = (ctypes.c_uint32 * (64 * 1024 // 4))()
+        self._handles = (wintypes.HANDLE * 2)(self._io_ev, self._stop_ev)
+        self._pending_io = False
+        self.kind = "win32"
+        self._arm_win32()
+
+    def _arm_win32(self) -> None:
+        self._k32.ResetEvent(self._io_ev)
+        ok = self._k32.ReadDirectoryChangesW(
+            self._handle, ctypes.byref(self._buf), ctypes.sizeof(self._buf), False,
+            _FILE_NOTIFY_CHANGE_FILE_NAME | _FILE_NOTIFY_CHANGE_LAST_WRITE,
+            None, ctypes.byref(self._ov), None,
+        )
+        if not ok:
+            raise OSError(ctypes.get_last_error(), "ReadDirectoryChangesW failed")
+        self._pending_io = True
+
+    def _wait_win32(self, timeout: Optional[float]) -> Optional[list[str]]:
+        from ctypes import wintypes
+
+        if not self._pending_io:
+            self._arm_win32()
+        ms = _INFINITE if timeout is None else max(0, int(timeout * 1000))
+        rc = self._k32.WaitForMultipleObjects(2, self._handles, False, ms)
+        if rc == _WAIT_OBJECT_0 + 1:
+            self._k32.ResetEvent(self._stop_ev)
+            return []
+        if rc != _WAIT_OBJECT_0:
+            return []
+        n = wintypes.DWORD(0)
+        self._pending_io = False
+        if not self._k32.GetOverlappedResult(self._handle, ctypes.byref(self._ov), ctypes.byref(n), False):
+            return None
+        if n.value == 0:
+            # Kernel buffer overflowed: changes were dropped
+            self._arm_win32()
+            return None
+        raw = ctypes.string_at(ctypes.addressof(self._buf), n.value)
+        self._arm_win32()
+        out: list[str] = []
+        off = 0
+        while True:
+            nxt, action, nlen = _FNI_HEADER.unpack_from(raw, off)
+            if action in _FILE_ACTIONS:
+                name = raw[off + _FNI_HEADER.size: off + _FNI_HEADER.size + nlen].decode("utf-16-le", errors="ignore")
+                if self._wanted(name):
+                    path = os.path.join(self._path, name)
+                    if path not in out:
+                        out.append(path)
+            if not nxt:
+                break
+            off += nxt
+        return out
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Iterable, Sequence, Tuple
+import os
+import threading
+from typing import Iterable, Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
@@ -9,6 +11,58 @@ import numpy as np
 Coord = Tuple[int, int]
 Rect = Tuple[Coord, Coord]
 
+# Per-thread matchTemplate result buffers keyed by shape (matching runs on pool threads)
+_tm_scratch = threading.local()
+_TM_SCRATCH_MAX = 32
+
+
+def _match_result(image, template):
+    """Run TM_CCOEFF_NORMED into a reused float32 buffer instead of a fresh array."""
+    rh = image.shape[0] - template.shape[0] + 1
+    rw = image.shape[1] - template.shape[1] + 1
+    if rh <= 0 or rw <= 0:
+        # Let OpenCV raise its usual size error
+        return cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    bufs = getattr(_tm_scratch, "bufs", None)
+    if bufs is None:
+        bufs = _tm_scratch.bufs = {}
+    buf = bufs.get((rh, rw))
+    if buf is None:
+        if len(bufs) >= _TM_SCRATCH_MAX:
+            bufs.clear()
+        buf = bufs[(rh, rw)] = np.empty((rh, rw), np.float32)
+    return cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED, result=buf)
+
+
+def decode_image(data: bytes, flags: Optional[int] = None):
+    """Decode encoded image bytes (PNG/JPEG/...) to a BGR array; None if undecodable.
+
+    `flags` defaults to IMREAD_COLOR; pass e.g. IMREAD_REDUCED_COLOR_2 for a half-size frame.
+    """
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR if flags is None else flags)
+
+
+def _png_compression() -> int:
+    """PNG DEFLATE level for outputs from env `OUTPUT_PNG_COMPRESSION` (0-9, default 1)."""
+    try:
+        return max(0, min(9, int((os.getenv("OUTPUT_PNG_COMPRESSION", "1") or "1").strip())))
+    except Exception:
+        return 1
+
+
+def write_image(path: str, img) -> bool:
+    """`cv2.imwrite` for product outputs (koutiku/haisin).
+
+    PNGs are written with a fast DEFLATE level (default 1 instead of OpenCV's 3):
+    screenshots encode several times faster for a slightly larger file. Other
+    formats use OpenCV defaults.
+    """
+    if path.rpartition(".")[2].lower() == "png":
+        return bool(cv2.imwrite(path, img, [cv2.IMWRITE_PNG_COMPRESSION, _png_compression()]))
+    return bool(cv2.imwrite(path, img))
+
 
 def crop_image_by_rect(img, rect: Rect):
     (x1, y1), (x2, y2) = rect
@@ -16,7 +70,13 @@ def crop_image_by_rect(img, rect: Rect):
     return img[y1:y2, x1:x2]
 
 
+def coords_to_slices(coords: Sequence[Tuple[int, int, int, int]]):
+    """Turn (x1, y1, x2, y2) boxes into reusable (row, col) slice pairs for `img[s]`."""
+    return tuple((slice(int(y1), int(y2)), slice(int(x1), int(x2))) for (x1, y1, x2, y2) in coords)
+
+
 def crop_by_coords_list(img, coords: Sequence[Tuple[int, int, int, int]]):
+    """Crop (x1, y1, x2, y2) boxes; results are views into `img`, not copies."""
     out = []
     for (x1, y1, x2, y2) in coords:
         out.append(img[int(y1):int(y2), int(x1):int(x2)])
@@ -29,11 +89,113 @@ def match_template(image, template, threshold: float, grayscale: bool = True) ->
             image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
         if len(template.shape) == 3:
             template = cv2.cvtColor(template, cv2.COLOR_BGR2GRAY)
-    res = cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+    res = _match_result(image, template)
     _, max_val, _, _ = cv2.minMaxLoc(res)
     return max_val >= threshold
 
 
+def template_stats(template):
+    """Zero-mean float64 copy of a grayscale template and its L2 norm, for `match_same_size`."""
+    t = template.astype(np.float64).ravel()
+    t -= t.mean()
+    return t, float(np.sqrt(np.dot(t, t)))
+
+
+def match_same_size(image, stats, threshold: float) -> bool:
+    """TM_CCOEFF_NORMED for a grayscale image exactly the size of the template.
+
+    matchTemplate then yields a single value, so the score is computed directly:
+    the template side (`template_stats`) is cached by the caller and only the
+    image's sum and sum of squares are taken per call. Flat images score 0 as in
+    OpenCV.
+    """
+    tpl_c, tpl_norm = stats
+    x = image.astype(np.float64).ravel()
+    if x.size != tpl_c.size:
+        raise ValueError("image and template sizes differ")
+    # tpl_c sums to zero, so the image mean drops out of the numerator
+    num = float(np.dot(x, tpl_c))
+    s = float(x.sum())
+    var = float(np.dot(x, x)) - s * s / x.size
+    denom = float(np.sqrt(max(var, 0.0))) * tpl_norm
+    if denom <= 1e-9:
+        return 0.0 >= threshold
+    return max(-1.0, min(1.0, num / denom)) >= threshold
+
+
+def to_gray(img):
+    """Return a single-channel view of `img` (no-op when already grayscale)."""
+    if len(img.shape) == 3:
+        return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return img
+
+
+def pyramid_down(img):
+    """Half-resolution copy used as the coarse level of `match_template_pyramid`."""
+    return cv2.resize(img, None, fx=0.5, fy=0.5, interpolation=cv2.INTER_AREA)
+
+
+# Below this template size the half-resolution level carries too little detail
+_PYRAMID_MIN_SIDE = 16
+
+
+def match_template_pyramid(
+    image,
+    template,
+    threshold: float,
+    image_half=None,
+    template_half=None,
+    margin: float = 0.1,
+) -> bool:
+    """Two-level TM_CCOEFF_NORMED match on grayscale inputs.
+
+    Search at half resolution first; a coarse score below `threshold - margin`
+    rejects outright, otherwise the hit is confirmed at full resolution in a small
+    window around the coarse location. Precomputed half-size images can be passed
+    to skip the resize.
+    """
+    th, tw = template.shape[:2]
+    ih, iw = image.shape[:2]
+    if ih < th or iw < tw:
+        return False
+    if th < _PYRAMID_MIN_SIDE or tw < _PYRAMID_MIN_SIDE:
+        return match_template(image, template, threshold, grayscale=False)
+    if template_half is None:
+        template_half = pyramid_down(template)
+    if image_half is None:
+        image_half = pyramid_down(image)
+    if image_half.shape[0] < template_half.shape[0] or image_half.shape[1] < template_half.shape[1]:
+        return match_template(image, template, threshold, grayscale=False)
+    res = _match_result(image_half, template_half)
+    _, max_val, _, (x, y) = cv2.minMaxLoc(res)
+    if max_val < threshold - margin:
+        return False
+    # Confirm at full resolution around the coarse hit (+/- 2px covers rounding)
+    x0 = max(0, 2 * x - 2)
+    y0 = max(0, 2 * y - 2)
+    x1 = min(iw, 2 * x + tw + 2)
+    y1 = min(ih, 2 * y + th + 2)
+    return match_template(image[y0:y1, x0:x1], template, threshold, grayscale=False)
+
+
+def dhash(img) -> int:
+    """64-bit difference hash: 9x8 grayscale thumbnail, one bit per horizontal gradient."""
+    small = cv2.resize(to_gray(img), (9, 8), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(small[:, 1:] > small[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+_HAS_BIT_COUNT = hasattr(int, "bit_count")
+
+
+def hamming64(a: int, b: int) -> int:
+    x = a ^ b
+    # int.bit_count (3.10+) is a native popcount; bin() builds a 64-char string
+    if _HAS_BIT_COUNT:
+        return x.bit_count()
+    return bin(x).count("1")
+
+
 def find_any_match(candidates: Iterable, template, threshold: float) -> bool:
     for c in candidates:
         if match_template(c, template, threshold, grayscale=True):
@@ -28,6 +28,21 @@ def append_result(
     - image: file name only (not path)
     - result: one of win/lose/disconnect (free text tolerated)
     """
+    append_results_bulk(base_dir, [(image_name, result, ts)], season=season)
+
+
+def append_results_bulk(
+    base_dir: str,
+    rows: Iterable[Tuple[str, str, Optional[float]]],
+    season: Optional[str] = None,
+) -> None:
+    """Append several (image, result, ts) rows with a single open of the CSV.
+
+    Same columns and header handling as append_result.
+    """
+    rows = list(rows)
+    if not rows:
+        return
     path = _results_csv_path(base_dir)
     os.makedirs(os.path.dirname(path), exist_ok=True)
     exists = os.path.exists(path)
@@ -46,17 +61,18 @@ def append_result(
         # New file: include season column if provided
         if season is not None:
             header = ["timestamp", "image", "result", "season"]
-    t = dt.datetime.fromtimestamp(ts or dt.datetime.now().timestamp())
-    ts_str = t.strftime("%Y-%m-%d %H:%M:%S")
+    with_season = "season" in header
     try:
         with open(path, "a", newline="", encoding="utf-8") as f:
             w = csv.writer(f)
             if not exists:
                 w.writerow(header)  # header
-            row = [ts_str, image_name, result]
-            if "season" in header:
-                row.append(season or "")
-            w.writerow(row)
+            for image_name, result, ts in rows:
+                t = dt.datetime.fromtimestamp(ts or dt.datetime.now().timestamp())
+                row = [t.strftime("%Y-%m-%d %H:%M:%S"), image_name, result]
+                if with_season:
+                    row.append(season or "")
+                w.writerow(row)
     except Exception:
         # Best-effort; swallow to avoid crashing threads
         pass
@@ -181,6 +197,14 @@ def add_result_tag(base_dir: str, image_name: str, result: str) -> None:
 
 def add_tags(base_dir: str, image_name: str, tags: List[str]) -> None:
     """Add multiple tags to the image entry in koutiku/_tags.json (deduped)."""
+    add_tags_bulk(base_dir, [(image_name, tags)])
+
+
+def add_tags_bulk(base_dir: str, updates: Iterable[Tuple[str, List[str]]]) -> None:
+    """Apply several (image, tags) updates with one read-modify-write of _tags.json."""
+    updates = list(updates)
+    if not updates:
+        return
     tags_path = paths_utils.get_tags_json_path(base_dir)
     os.makedirs(os.path.dirname(tags_path), exist_ok=True)
     data: Dict[str, List[str]] = {}
@@ -193,15 +217,16 @@ def add_tags(base_dir: str, image_name: str, tags: List[str]) -> None:
                         data[k] = [str(x) for x in v if x]
     except Exception:
         data = {}
-    data.setdefault(image_name, [])
-    cur = set(data[image_name])
-    for t in tags:
-        t2 = str(t or "").strip()
-        if not t2:
-            continue
-        if t2 not in cur:
-            data[image_name].append(t2)
-            cur.add(t2)
+    for image_name, tags in updates:
+        data.setdefault(image_name, [])
+        cur = set(data[image_name])
+        for t in tags:
+            t2 = str(t or "").strip()
+            if not t2:
+                continue
+            if t2 not in cur:
+                data[image_name].append(t2)
+                cur.add(t2)
     try:
         with open(tags_path, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)